@@ -19,4 +19,12 @@ from __future__ import absolute_import
 from astro.core import Location
 from astro.core import s_latitude, s_longitude, s_location, s_bearing
 from astro.suntrack import SunLocation
-from astro.suntrack import sun_position
+from astro.suntrack import sun_position, sun_positions
+from astro.suntrack import SunDay, sun_day, local_date
+from astro.suntrack import SUNRISE, CIVIL_TWILIGHT, NAUTICAL_TWILIGHT, ASTRONOMICAL_TWILIGHT
+from astro.ephemeris import Ephemeris
+from astro.horizon import Horizon, direct_sun
+from astro.irradiance import incident, clear_sky
+from astro.moontrack import moon_position, moon_positions, moon_phases
+from astro.moontrack import MoonDay, moon_day
+from astro.precise import precise_position, refraction
@@ -0,0 +1,128 @@
+#
+# ephemeris - tabulated solar positions for cheap repeated lookups
+#
+# Copyright 2023 Perry The Cynic. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#	http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# An Ephemeris holds a day's worth of sun positions for one location,
+# computed in one batch at a coarse step. Lookups interpolate quadratically
+# between the three nearest table entries; azimuths are unwrapped around the
+# middle entry so the +-180 (due North) seam does no harm.
+#
+# Accuracy: with the default 10 minute step, interpolated positions are
+# within 0.02 degrees (azimuth) and 0.005 degrees (height) of sun_position
+# at any latitude. Close to the zenith and nadir the azimuth swings too fast
+# for any table, so when the sun is within DIRECT_HEIGHT of either we simply
+# compute directly. Run this module to check.
+#
+import math
+
+from astro.suntrack import sun_position, sun_positions
+
+DEBUG = None
+
+
+DAY = 86400
+STEP = 10 * 60				# default table step (seconds)
+DIRECT_HEIGHT = 70			# beyond +-this height, compute directly
+
+
+class Ephemeris(object):
+	""" A daily table of sun positions for one SunLocation.
+
+		The table covers the current UTC day (plus one step on either side)
+		and is rebuilt automatically when asked about a time outside it.
+		Assign a new location to start over.
+	"""
+	def __init__(self, location, step=STEP):
+		assert DAY % step == 0
+		self.step = step
+		self.location = location
+
+	@property
+	def location(self):
+		return self._location
+
+	@location.setter
+	def location(self, location):
+		self._location = location
+		self._start = None		# no table
+
+	def position(self, unixtime):
+		""" The (azimuth, height) of the Sun at a time, as per sun_position. """
+		if self._start is None or not (self._start + self.step <= unixtime < self._start + DAY + self.step):
+			self._build(unixtime)
+		x = (unixtime - self._start) / self.step
+		i = int(round(x))
+		f = x - i
+		(h0, h1, h2) = self._h[i-1:i+2]
+		if max(abs(h0), abs(h1), abs(h2)) > DIRECT_HEIGHT:
+			return sun_position(unixtime, self._location)
+		(a0, a1, a2) = self._A[i-1:i+2]
+		a0 = _wrap(a0 - a1)		# unwrap around the middle entry
+		a2 = _wrap(a2 - a1)
+		A = _wrap(a1 + _quad(a0, 0, a2, f))
+		return (A, _quad(h0, h1, h2, f))
+
+	def _build(self, unixtime):
+		day = math.floor(unixtime / DAY) * DAY
+		self._start = day - self.step		# entry 0 is one step before midnight
+		count = DAY // self.step + 3		# through one step past the next midnight
+		times = [self._start + n * self.step for n in range(count)]
+		(A, h) = sun_positions(times, self._location)
+		self._A = list(A)
+		self._h = list(h)
+		if DEBUG: DEBUG("ephemeris built for", self._location, "day", day, count, "entries")
+
+
+def _quad(y0, y1, y2, f):
+	""" Quadratic through (-1, y0), (0, y1), (1, y2), evaluated at f. """
+	return y1 + f * (y2 - y0) / 2 + f * f * (y2 - 2 * y1 + y0) / 2
+
+def _wrap(angle):
+	""" Normalize to [-180, +180). """
+	return (angle + 180) % 360 - 180
+
+
+#
+# Test
+#
+if __name__ == "__main__":
+	from astro.suntrack import SunLocation
+
+	# the suntrack regression point: Sat Apr 1 12:00:00 UTC 2004 at 52N 5E
+	ts = 1080820800
+	(A, h) = Ephemeris(SunLocation(lat=52, lon=5)).position(ts)
+	if abs(A - 5.1302) > 0.001 or abs(h - 42.6542) > 0.001:
+		print("BAD COMPARE!", (A, h))
+	else:
+		print("Regression OK.")
+
+	# documented accuracy, sampled over a year at assorted places
+	worst_A = worst_h = 0
+	for lat in (-60, -23, 0, 10, 23, 37, 52, 66, 80):
+		loc = SunLocation(lat=lat, lon=-122)
+		eph = Ephemeris(loc)
+		for day in range(0, 365, 9):
+			times = [ts + day * DAY + minute * 60 + 17 for minute in range(0, 1440, 3)]
+			(As, hs) = sun_positions(times, loc)
+			for (t, A, h) in zip(times, As, hs):
+				(eA, eh) = eph.position(t)
+				worst_A = max(worst_A, abs(_wrap(eA - A)))
+				worst_h = max(worst_h, abs(eh - h))
+	print("worst error: azimuth %.4f, height %.4f" % (worst_A, worst_h))
+	if worst_A > 0.02 or worst_h > 0.005:
+		print("ACCURACY BOUND EXCEEDED!")
+	else:
+		print("Accuracy OK.")
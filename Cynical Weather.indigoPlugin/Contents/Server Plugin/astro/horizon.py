@@ -0,0 +1,128 @@
+#
+# horizon - obstruction profiles and direct sunlight
+#
+# Copyright 2023 Perry The Cynic. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#	http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# A Horizon describes what blocks the view of the sky from some spot:
+# for each compass bearing (true North = 0, East = 90), the height the Sun
+# must clear to shine through. It is given as a few (bearing, height) points,
+# interpolated linearly all the way around, and compiled into a dense table
+# so that lookups cost the same no matter how detailed the profile is.
+#
+from array import array
+
+from astro.suntrack import sun_positions, sun_day
+
+DEBUG = None
+
+
+RESOLUTION = 1.0			# default table resolution (degrees of bearing)
+
+
+class Horizon(object):
+	""" A horizon profile: minimum Sun height by compass bearing. """
+	def __init__(self, points, resolution=RESOLUTION):
+		points = sorted((bearing % 360, height) for (bearing, height) in points)
+		size = int(round(360 / resolution))
+		self.resolution = 360.0 / size
+		self.points = points
+		self._table = array('d', (_interpolate(points, n * self.resolution) for n in range(size)))
+
+	@classmethod
+	def parse(cls, text, **kwargs):
+		""" Make a Horizon from text like "90:10, 180:25, 250:5" (bearing:height pairs).
+
+			Raises ValueError if the text can't be understood.
+		"""
+		points = []
+		for item in text.split(","):
+			if item.strip():
+				(bearing, sep, height) = item.partition(":")
+				if not sep:
+					raise ValueError(f"expected bearing:height, not {item.strip()!r}")
+				points.append((float(bearing), float(height)))
+		if not points:
+			raise ValueError("empty horizon profile")
+		return cls(points, **kwargs)
+
+	def height(self, bearing):
+		""" The height the Sun must clear at a compass bearing. """
+		return self._table[int(round(bearing / self.resolution)) % len(self._table)]
+
+	def clear(self, sun):
+		""" Does a sun position (south-relative azimuth, height) clear the horizon? """
+		(A, h) = sun
+		return h > self._table[int(round((A + 180) / self.resolution)) % len(self._table)]
+
+	def __repr__(self):
+		return "<Horizon %s>" % ", ".join("%g:%g" % point for point in self.points)
+
+
+def _interpolate(points, bearing):
+	""" Linear interpolation around the circle through sorted (bearing, height) points. """
+	if not points:
+		return 0
+	for (n, (b1, h1)) in enumerate(points):
+		if b1 >= bearing:
+			(b0, h0) = points[n-1]		# wraps to the last point for n == 0
+			break
+	else:
+		(b0, h0) = points[-1]
+		(b1, h1) = points[0]
+	span = (b1 - b0) % 360
+	if span == 0:
+		return h1
+	return h0 + (h1 - h0) * ((bearing - b0) % 360) / span
+
+
+#
+# Direct sunlight over a day.
+#
+# For each facing (with an optional Horizon), find the stretches of the local
+# solar day during which the Sun is up, in front of the surface, and clear of
+# the horizon. All facings share one batch of sun positions.
+#
+STEP = 60					# sampling step (seconds); intervals are good to this
+
+def direct_sun(location, facings, horizons=None, date=None, step=STEP):
+	""" Compute direct-sun intervals for a list of facings at a SunLocation.
+
+		Horizons, if given, holds a Horizon (or None) for each facing.
+		Date (required) is the day to cover; see local_date.
+		Returns a list, per facing, of (start, end) UNIX time pairs.
+	"""
+	assert date is not None
+	day = sun_day(location, date)
+	times = [day.start + n * step for n in range(int((day.end - day.start) // step) + 1)]
+	(As, hs) = sun_positions(times, location)
+	up = [h > 0 for h in hs]
+	result = []
+	for (facing, horizon) in zip(facings, horizons or [None] * len(facings)):
+		lit = [u and abs((A - facing + 360) % 360 - 180) < 90 for (u, A) in zip(up, As)]
+		if horizon:
+			lit = [l and horizon.clear(sun) for (l, sun) in zip(lit, zip(As, hs))]
+		intervals = []
+		start = None
+		for (t, l) in zip(times, lit):
+			if l and start is None:
+				start = t
+			elif not l and start is not None:
+				intervals.append((start, t))
+				start = None
+		if start is not None:
+			intervals.append((start, times[-1]))
+		result.append(intervals)
+	if DEBUG: DEBUG("direct sun at", location, "for", len(facings), "facings on", day.date)
+	return result
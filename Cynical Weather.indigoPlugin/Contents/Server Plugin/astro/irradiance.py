@@ -0,0 +1,171 @@
+#
+# irradiance - sunlight falling on vertical surfaces
+#
+# Copyright 2023 Perry The Cynic. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#	http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Given global horizontal irradiance (GHI, W/m^2) and cloud cover over a
+# series of times - say, from an hourly weather forecast - estimate the power
+# arriving on vertical surfaces (windows and walls) of given facings.
+#
+# The model is deliberately simple:
+#  * If GHI is unknown, it's estimated from a clear-sky value (Kasten) reduced
+#    by cloud cover (Kasten & Czeplak).
+#  * GHI is split into diffuse and direct parts; the diffuse fraction grows
+#    with cloud cover from DIFFUSE_CLEAR to 1.
+#  * A vertical surface sees the direct beam by the cosine of its angle to
+#    the Sun (if the Sun is in front and clear of any Horizon), half of the
+#    (isotropic) sky's diffuse light, and half of the ground's reflection.
+#
+import math
+
+from astro.suntrack import sun_positions
+
+try:
+	import numpy
+except ImportError:					# optional; we'll do it the slow way
+	numpy = None
+
+DEBUG = None
+
+
+DIFFUSE_CLEAR = 0.15		# diffuse fraction of GHI under clear skies
+ALBEDO = 0.2				# ground reflectance
+MIN_HEIGHT = 2				# Sun heights below this (degrees) give no direct beam
+
+
+def clear_sky(height):
+	""" Clear-sky global horizontal irradiance (W/m^2) for a Sun height. """
+	if height <= 0:
+		return 0
+	return max(0, 910 * math.sin(math.radians(height)) - 30)
+
+
+def incident(location, times, ghi, cloudcover, facings, horizons=None):
+	""" Estimate irradiance (W/m^2) on vertical surfaces.
+
+		Times, ghi and cloudcover are parallel sequences (ghi and cloudcover
+		entries may be None or NaN if unknown). Facings are true bearings of
+		the surfaces, and horizons an optional parallel list of Horizons.
+		Returns a list, per facing, of irradiance per time.
+	"""
+	(As, hs) = sun_positions(times, location)
+	horizons = horizons or [None] * len(facings)
+	if numpy is not None:
+		return _incident_numpy(As, hs, ghi, cloudcover, facings, horizons)
+	return _incident_python(As, hs, ghi, cloudcover, facings, horizons)
+
+
+#
+# With NumPy, everything is computed array-wise: the per-time split as vectors,
+# and the facing-by-time join as one matrix (horizons masking their rows).
+#
+def _incident_numpy(As, hs, ghi, cloudcover, facings, horizons):
+	np = numpy
+	As = np.asarray(As, dtype=float)
+	hs = np.asarray(hs, dtype=float)
+	g = np.array(ghi, dtype=float)				# (None becomes NaN)
+	cc = np.array(cloudcover, dtype=float)
+
+	# per time: the direct/diffuse split (shared by all facings)
+	cc = np.where(np.isnan(cc), 0, np.clip(cc, 0, 100) / 100.0)
+	sin_h = np.sin(np.radians(hs))
+	clear = np.where(hs > 0, np.maximum(0, 910 * sin_h - 30), 0)
+	g = np.where(np.isnan(g), clear * (1 - 0.75 * cc ** 3.4), g)
+	diffuse = g * (DIFFUSE_CLEAR + (1 - DIFFUSE_CLEAR) * cc)
+	high = hs > MIN_HEIGHT
+	beam = np.where(high, (g - diffuse) / np.where(high, sin_h, 1), 0) * np.cos(np.radians(hs))
+	scattered = (diffuse + ALBEDO * g) / 2
+
+	# facings by times
+	cos_az = np.cos(np.radians(As[np.newaxis, :] - np.asarray(facings, dtype=float)[:, np.newaxis] + 180))
+	lit = (cos_az > 0) & (beam != 0)
+	masks = { }
+	for (row, horizon) in enumerate(horizons):
+		if horizon is not None:
+			if horizon not in masks:		# Orientations often share a Horizon
+				table = np.asarray(horizon._table)
+				masks[horizon] = hs > table[np.rint((As + 180) / horizon.resolution).astype(int) % len(table)]
+			lit[row] &= masks[horizon]
+	return (np.where(lit, beam * cos_az, 0) + scattered).tolist()
+
+
+def _incident_python(As, hs, ghi, cloudcover, facings, horizons):
+	# per time: sun geometry and the direct/diffuse split (shared by all facings)
+	hours = []
+	for (A, h, g, cc) in zip(As, hs, ghi, cloudcover):
+		cc = 0 if _unknown(cc) else min(max(cc, 0), 100) / 100.0
+		if _unknown(g):
+			g = clear_sky(h) * (1 - 0.75 * cc ** 3.4)
+		diffuse = g * (DIFFUSE_CLEAR + (1 - DIFFUSE_CLEAR) * cc)
+		beam = (g - diffuse) / math.sin(math.radians(h)) if h > MIN_HEIGHT else 0
+		hours.append(((A, h), math.cos(math.radians(h)), beam, (diffuse + ALBEDO * g) / 2))
+
+	result = []
+	for (facing, horizon) in zip(facings, horizons):
+		power = []
+		for (sun, cos_h, beam, scattered) in hours:
+			direct = 0
+			if beam:
+				cos_az = math.cos(math.radians(sun[0] - facing + 180))
+				if cos_az > 0 and (horizon is None or horizon.clear(sun)):
+					direct = beam * cos_h * cos_az
+			power.append(direct + scattered)
+		result.append(power)
+	return result
+
+
+def _unknown(value):
+	return value is None or value != value		# None or NaN
+
+
+#
+# Test
+#
+if __name__ == "__main__":
+	from astro.suntrack import SunLocation
+	from astro.horizon import Horizon
+
+	here = SunLocation(lat=37.265, lon=-121.96)
+	times = [1687262400 + n * 3600 for n in range(48)]		# 2023-06-20 12:00 UTC (5 AM local), hourly
+	ghi = [None if n % 5 == 0 else float('nan') if n % 7 == 0 else max(0, 900 - abs(n % 24 - 7) * 120) for n in range(48)]
+	clouds = [None if n % 11 == 0 else n * 13 % 120 - 10 for n in range(48)]	# (some out of range)
+	facings = [0, 90, 180, 270, 135]
+	wall = Horizon([(90, 30), (180, 30), (270, 30)])
+	horizons = [None, wall, None, wall, None]
+
+	power = incident(here, times, ghi, clouds, facings, horizons)
+	bad = False
+	if numpy is not None:			# both ways must agree
+		(As, hs) = sun_positions(times, here)
+		slow = _incident_python(As, hs, ghi, clouds, facings, horizons)
+		for (fast_row, slow_row) in zip(power, slow):
+			if any(abs(f - s) > 1e-6 for (f, s) in zip(fast_row, slow_row)):
+				print("BAD NUMPY COMPARE!", fast_row, slow_row)
+				bad = True
+	(As, hs) = sun_positions(times, here)
+	noon = max(range(24), key=lambda n: hs[n])
+	if not (len(power) == len(facings) and all(len(row) == len(times) for row in power)
+			and power[2][noon] > power[0][noon]					# south beats north at noon
+			and all(power[f][n] == power[0][n] for f in range(5) for n in range(48) if hs[n] < 0)	# night: all alike (just diffuse)
+			and min(min(row) for row in power) >= 0):
+		print("BAD IRRADIANCE!")
+		bad = True
+	unknown = incident(here, times[noon:noon+1], [None], [0], [180])[0][0]
+	cloudy = incident(here, times[noon:noon+1], [None], [100], [180])[0][0]
+	if not (unknown > cloudy > 0 and abs(incident(here, times[noon:noon+1], [0.0], [0], [180])[0][0]) < 1e-9):
+		print("BAD FALLBACK!", unknown, cloudy)				# unknown GHI uses clear sky; a real 0 stays 0
+		bad = True
+	if not bad:
+		print("Regression OK%s." % ("" if numpy is not None else " (without NumPy)"))
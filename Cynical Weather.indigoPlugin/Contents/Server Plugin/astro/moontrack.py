@@ -0,0 +1,204 @@
+from __future__ import print_function
+from __future__ import absolute_import
+#
+# moontrack - lunar position, rise/set, and illumination
+#
+# Copyright 2023 Perry The Cynic. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#	http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Formulas: http://aa.quae.nl/en/reken/hemelpositie.html (low precision Moon)
+# This is good to a degree or so - plenty for rise/set times and phases.
+# Positions use the suntrack conventions: azimuth south-relative
+# (0 = due South, -90 = due East), heights in degrees over the horizon.
+#
+import time
+import datetime
+from collections import OrderedDict
+
+from astro.suntrack import Planet, SunLocation, EARTH, J2000
+from astro.suntrack import sin, cos, tan, arctan, arcsin
+from astro.suntrack import solar_day
+
+DEBUG = None
+
+
+#
+# Characterize the Moon's orbit (as seen from Earth).
+#
+MOON = Planet("Moon",
+	L0 = 218.316, L1 = 13.176396,	# mean ecliptic longitude
+	M0 = 134.963, M1 = 13.064993,	# mean anomaly
+	F0 = 93.272, F1 = 13.229350,	# mean distance from ascending node
+	LA = 6.289,						# longitude amplitude
+	BA = 5.128,						# latitude amplitude
+	E = 23.4397,					# obliquity of the ecliptic
+)
+
+RISE_HEIGHT = 0.133			# center height at rise/set (parallax less refraction and radius)
+
+
+#
+# Calculate lunar positions for a series of times.
+#
+def moon_positions(unixtimes, location, moon=MOON):
+	""" Calculate horizon coordinates of the Moon for a sequence of times at a SunLocation.
+
+		Returns a pair of lists (azimuths, heights).
+	"""
+	azimuths = []
+	heights = []
+	for t in unixtimes:
+		(alpha, delta, _) = _equatorial(t, moon)
+		TH = location.planet.TH0 + location.planet.TH1 * _days(t) + location.lon	# sidereal time
+		H = (TH - alpha) % 360
+		azimuths.append(arctan(sin(H), cos(H) * location.lat_sin - tan(delta) * location.lat_cos))
+		heights.append(arcsin(location.lat_sin * sin(delta) + location.lat_cos * cos(delta) * cos(H)))
+	return (azimuths, heights)
+
+def moon_position(unixtime, location, moon=MOON):
+	""" Calculate the horizon coordinates of the Moon at a given time and location. """
+	(A, h) = moon_positions([unixtime], location, moon)
+	return (A[0], h[0])
+
+
+def moon_phases(unixtimes, moon=MOON, planet=EARTH):
+	""" Calculate (phase, illumination) of the Moon for a sequence of times.
+
+		Phase runs from 0 (new) through 0.5 (full) back toward 1, as weather
+		services report it. Illumination is the lit fraction of the disk, 0 to 1.
+	"""
+	result = []
+	for t in unixtimes:
+		(_, _, (l_moon, b_moon)) = _equatorial(t, moon)
+		elongation = (l_moon - _sun_longitude(t, planet)) % 360
+		result.append((elongation / 360.0, (1 - cos(b_moon) * cos(elongation)) / 2))
+	return result
+
+
+def _days(unixtime):
+	return unixtime / 86400.0 + 2440587.5 - J2000		# days since J2000
+
+def _equatorial(unixtime, m):
+	""" (right ascension, declination, (ecliptic longitude, latitude)) of the Moon. """
+	d = _days(unixtime)
+	L = m.L0 + m.L1 * d
+	M = m.M0 + m.M1 * d
+	F = m.F0 + m.F1 * d
+	l = L + m.LA * sin(M)
+	b = m.BA * sin(F)
+	alpha = arctan(sin(l) * cos(m.E) - tan(b) * sin(m.E), cos(l))
+	delta = arcsin(sin(b) * cos(m.E) + cos(b) * sin(m.E) * sin(l))
+	return (alpha, delta, (l, b))
+
+def _sun_longitude(unixtime, p):
+	""" Ecliptic longitude of the Sun, as in suntrack.sun_position. """
+	M = p.M0 + p.M1 * _days(unixtime)
+	C = sum([p.Cn[i] * sin((i+1) * M) for i in range(0, len(p.Cn))])
+	return M + p.EL + C + 180
+
+
+#
+# The Moon's day at a location: rise, set, and illumination.
+# Unlike the Sun, the Moon may rise or set not at all on a given (solar) day;
+# those times are then None. Also unlike the Sun, it may set before it rises.
+#
+EVENT_STEP = 10 * 60		# sampling step (seconds)
+EVENT_PRECISION = 1			# rise/set times are good to this many seconds
+DAY_CACHE = 32				# number of MoonDays we remember
+
+
+class MoonDay(object):
+	""" The Moon's course for a SunLocation and date (mean solar day there).
+
+		Rise and set are UNIX times or None. Phase and illumination are
+		for mean local noon.
+	"""
+	def __init__(self, location, date, moon=MOON):
+		self.location = location
+		self.date = date
+		self.moon = moon
+		(self.start, self.end) = solar_day(location, date)
+		times = [self.start + n * EVENT_STEP for n in range(86400 // EVENT_STEP + 1)]
+		heights = moon_positions(times, location, moon)[1]
+		self.rise = self.set = None
+		for ((t0, h0), (t1, h1)) in zip(zip(times, heights), zip(times[1:], heights[1:])):
+			if self.rise is None and h0 < RISE_HEIGHT <= h1:
+				self.rise = self._bisect(t0, t1, rising=True)
+			elif self.set is None and h0 >= RISE_HEIGHT > h1:
+				self.set = self._bisect(t0, t1, rising=False)
+		(self.phase, self.illumination) = moon_phases([self.start + 43200], moon, location.planet)[0]
+
+	def _bisect(self, t0, t1, rising):
+		while t1 - t0 > EVENT_PRECISION:
+			mid = (t0 + t1) / 2
+			if (moon_position(mid, self.location, self.moon)[1] < RISE_HEIGHT) == rising:
+				t0 = mid
+			else:
+				t1 = mid
+		return (t0 + t1) / 2
+
+	def __repr__(self):
+		return "<MoonDay %s %s rise %s set %s lit %.2f>" % (self.location, self.date,
+			self.rise and time.ctime(self.rise), self.set and time.ctime(self.set), self.illumination)
+
+
+_days_cache = OrderedDict()
+
+def moon_day(location, date, moon=MOON):
+	""" Get the MoonDay for a location and date. Cached.
+		For "today there", pass local_date(location, now).
+	"""
+	key = (location.lat, location.lon, location.planet.name, location.precise, moon.name, date)
+	day = _days_cache.get(key)
+	if day is None:
+		day = _days_cache[key] = MoonDay(location, date, moon)
+		if len(_days_cache) > DAY_CACHE:
+			_days_cache.popitem(last=False)	# forget oldest
+	else:
+		_days_cache.move_to_end(key)
+	return day
+
+
+#
+# Test
+#
+if __name__ == "__main__":
+	import copy
+	pos = SunLocation(lat=52, lon=5)
+	# April 2004: full Moon Apr 5 11:03 UTC, new Moon Apr 19 13:21 UTC
+	full = datetime.datetime(2004, 4, 5, 11, 3, tzinfo=datetime.timezone.utc).timestamp()
+	new = datetime.datetime(2004, 4, 19, 13, 21, tzinfo=datetime.timezone.utc).timestamp()
+	((full_phase, full_lit), (new_phase, new_lit)) = moon_phases([full, new])
+	bad = False
+	if abs(full_phase - 0.5) > 0.01 or full_lit < 0.99 or min(new_phase, 1 - new_phase) > 0.01 or new_lit > 0.01:
+		print("BAD PHASES!", (full_phase, full_lit), (new_phase, new_lit))
+		bad = True
+	# rise/set at the suntrack regression location: heights at the events must match
+	for day in range(1, 31):
+		md = moon_day(pos, datetime.date(2004, 4, day))
+		for t in (md.rise, md.set):
+			if t is not None and abs(moon_position(t, pos)[1] - RISE_HEIGHT) > 0.01:
+				print("BAD EVENT!", md)
+				bad = True
+		if not (md.rise or md.set):
+			print("NO EVENTS?", md)
+			bad = True
+	other = copy.copy(MOON)			# (a different moon gets its own day)
+	other.name = "Other Moon"
+	if (moon_day(pos, datetime.date(2004, 4, 1)) is not moon_day(pos, datetime.date(2004, 4, 1))
+			or moon_day(pos, datetime.date(2004, 4, 1), other) is moon_day(pos, datetime.date(2004, 4, 1))):
+		print("BAD CACHE!")
+		bad = True
+	if not bad:
+		print("Regression OK.")
@@ -0,0 +1,183 @@
+from __future__ import print_function
+from __future__ import absolute_import
+#
+# precise - higher-precision solar position
+#
+# Copyright 2023 Perry The Cynic. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#	http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Formulas: Meeus, Astronomical Algorithms, ch. 12, 22 and 25 (as used by
+# the NOAA solar calculator), with the principal nutation terms, aberration,
+# Delta T, and atmospheric refraction. Good to about 0.01 degrees for
+# centuries around J2000 - short of the full NREL SPA (which carries hundreds
+# of periodic terms), but some 50 times better than suntrack's default model.
+#
+# Everything that depends only on time (Julian century, nutation, obliquity,
+# the Sun's equatorial coordinates and sidereal time) is computed once per
+# timestamp and cached, so evaluating many locations at the same instants
+# only pays for the final, location-specific transformation.
+#
+# This is selected per location: SunLocation(..., precise=True).
+#
+import math
+from functools import lru_cache
+
+DEBUG = None
+
+
+DELTA_T = 69.2				# TT - UT (seconds); about right for the 2020s
+TIME_CACHE = 4096			# number of timestamps whose terms we remember
+
+PRESSURE = 1010				# standard atmosphere (millibars)
+TEMPERATURE = 10			# standard temperature (Celsius)
+REFRACTION_LIMIT = -1		# lowest true height (degrees) the refraction formula holds for
+
+
+def sin(s): return math.sin(math.radians(s))
+def cos(s): return math.cos(math.radians(s))
+def tan(s): return math.tan(math.radians(s))
+def arctan(s, t): return math.degrees(math.atan2(s, t))
+def arcsin(s): return math.degrees(math.asin(s))
+
+
+@lru_cache(maxsize=TIME_CACHE)
+def time_terms(unixtime):
+	""" Location-independent terms: (right ascension, declination, apparent sidereal time). """
+	JD = unixtime / 86400.0 + 2440587.5			# Julian day (UT)
+	T = (JD + DELTA_T / 86400.0 - 2451545) / 36525	# Julian centuries (TT)
+
+	# the Sun's geometric orbit
+	L0 = 280.46646 + T * (36000.76983 + T * 0.0003032)	# mean longitude
+	M = 357.52911 + T * (35999.05029 - T * 0.0001537)	# mean anomaly
+	C = (sin(M) * (1.914602 - T * (0.004817 + T * 0.000014))
+		+ sin(2 * M) * (0.019993 - T * 0.000101)
+		+ sin(3 * M) * 0.000289)					# equation of center
+
+	# nutation (principal terms) and obliquity
+	omega = 125.04452 - 1934.136261 * T			# Moon's ascending node
+	Lm = 218.3165 + 481267.8813 * T				# Moon's mean longitude
+	d_psi = (-17.20 * sin(omega) - 1.32 * sin(2 * L0) - 0.23 * sin(2 * Lm) + 0.21 * sin(2 * omega)) / 3600
+	d_eps = (9.20 * cos(omega) + 0.57 * cos(2 * L0) + 0.10 * cos(2 * Lm) - 0.09 * cos(2 * omega)) / 3600
+	eps = 23.439291111 - T * (0.0130041667 + T * (1.6389e-7 - T * 5.0361e-7)) + d_eps
+
+	# apparent longitude (with aberration) and equatorial coordinates
+	lam = L0 + C + d_psi - 0.00569
+	alpha = arctan(cos(eps) * sin(lam), cos(lam))
+	delta = arcsin(sin(eps) * sin(lam))
+
+	# apparent sidereal time at Greenwich
+	D = JD - 2451545
+	Tu = D / 36525
+	theta = 280.46061837 + 360.98564736629 * D + Tu * Tu * (0.000387933 - Tu / 38710000)
+	theta += d_psi * cos(eps)
+	if DEBUG: DEBUG("T", T, "alpha", alpha % 360, "delta", delta, "theta", theta % 360)
+	return (alpha, delta, theta)
+
+
+def precise_position(unixtime, location, refract=True):
+	""" Calculate (azimuth, height) of the Sun, suntrack conventions, precisely.
+
+		The height includes atmospheric refraction for the location's pressure
+		and temperature (if it has them), else for a standard atmosphere.
+		With refract=False, it is the true (geometric) height instead.
+	"""
+	(alpha, delta, theta) = time_terms(unixtime)
+	H = (theta + location.lon - alpha) % 360		# local hour angle
+	A = arctan(sin(H), cos(H) * location.lat_sin - tan(delta) * location.lat_cos)
+	h = arcsin(location.lat_sin * sin(delta) + location.lat_cos * cos(delta) * cos(H))
+	if not refract:
+		return (A, h)
+	return (A, h + refraction(h,
+		getattr(location, 'pressure', PRESSURE), getattr(location, 'temperature', TEMPERATURE)))
+
+
+def refraction(h, pressure=PRESSURE, temperature=TEMPERATURE):
+	""" Atmospheric refraction (degrees) for a true height (Saemundsson).
+
+		Below REFRACTION_LIMIT, the refraction there is tapered linearly to nothing
+		over one more degree, so apparent height stays continuous (and increasing)
+		in true height.
+	"""
+	scale = 1
+	if h < REFRACTION_LIMIT:
+		scale = 1 - (REFRACTION_LIMIT - h)
+		if scale <= 0:
+			return 0
+		h = REFRACTION_LIMIT
+	R = 1.02 / tan(h + 10.3 / (h + 5.11))		# arcminutes
+	return scale * R / 60 * (pressure / 1010.0) * (283.0 / (273 + temperature))
+
+
+#
+# Test: accuracy against reference positions, and speed against suntrack.
+# References are NREL SPA results (sea level, Delta T 69.2 s except for the
+# paper's own example), chosen across latitudes, seasons, and Sun heights
+# down to the horizon.
+#
+REFERENCE = [
+	# (what, UNIX time, lat, lon, pressure, temperature, azimuth from North, zenith)
+	("NREL SPA paper example", 1066419030, 39.742476, -105.1786, 820, 11, 194.34024, 50.11162),
+	("equator, March equinox morning", 1710925200, 0, 0, 1010, 10, 89.86683, 46.82034),
+	("Cupertino, June solstice morning", 1718899200, 37.265, -121.96, 1010, 10, 85.84019, 54.58509),
+	("Amsterdam, December solstice noon", 1734781200, 52.37, 4.9, 1010, 10, 180.31128, 75.74660),
+	("Sydney, January afternoon", 1736917200, -33.87, 151.21, 1010, 10, 276.73173, 40.61044),
+	("Reykjavik, December solstice noon", 1734787800, 64.15, -21.94, 1010, 10, 180.89941, 87.33654),
+	("McMurdo, midnight sun", 1734782400, -77.85, 166.67, 1010, 10, 192.07108, 78.35036),
+	("Amsterdam, September equinox, 3 degrees up", 1726984260, 52.37, 4.9, 1010, 10, 93.49529, 86.93503),
+	("Amsterdam, September equinox, 1 degree up", 1726983420, 52.37, 4.9, 1010, 10, 90.71767, 88.90945),
+	("Cupertino, June sunset, half a degree up", 1718940420, 37.265, -121.96, 1010, 10, 300.02845, 89.56003),
+	("Singapore, sunrise, a quarter degree up", 1714604340, 1.35, 103.82, 1010, 10, 74.53961, 89.76487),
+]
+
+if __name__ == "__main__":
+	import time
+	from astro.suntrack import SunLocation, sun_position
+
+	bad = False
+	for (what, ts, lat, lon, pressure, temperature, az, zenith) in REFERENCE:
+		loc = SunLocation(lat=lat, lon=lon, precise=True)
+		loc.pressure = pressure
+		loc.temperature = temperature
+		(A, h) = sun_position(ts, loc)
+		(rough_A, rough_h) = sun_position(ts, SunLocation(lat=lat, lon=lon))
+		err_A = abs((A + 180 - az + 180) % 360 - 180)
+		err_h = abs(h - (90 - zenith))
+		print("%s: precise error az %.4f h %.4f; default error az %.4f h %.4f" % (what,
+			err_A, err_h,
+			abs((rough_A + 180 - az + 180) % 360 - 180), abs(rough_h - (90 - zenith))))
+		if err_A > 0.01 or err_h > 0.01:
+			print("BAD COMPARE!")
+			bad = True
+
+	# apparent height must be continuous and increasing in true height, down through the taper
+	heights = [n / 100.0 for n in range(-500, 501)]
+	apparent = [h + refraction(h) for h in heights]
+	if (any(b <= a or b - a > 0.05 for (a, b) in zip(apparent, apparent[1:]))
+			or refraction(-2.5) != 0 or abs(refraction(0) - 0.48) > 0.01):
+		print("BAD REFRACTION!")
+		bad = True
+
+	# speed: a day of minutes at one place and at 20 places, default vs precise
+	times = [1080820800 + n * 60 for n in range(1440)]
+	for (what, precise, count) in (("default", False, 20), ("precise, one place", True, 1), ("precise, 20 places", True, 20)):
+		places = [SunLocation(lat=30 + n, lon=-120 + n, precise=precise) for n in range(count)]
+		time_terms.cache_clear()
+		start = time.time()
+		for loc in places:
+			for t in times:
+				sun_position(t, loc)
+		elapsed = time.time() - start
+		print("%s: %d calls/second" % (what, len(places) * len(times) / elapsed))
+	if not bad:
+		print("Regression OK.")
@@ -22,8 +22,16 @@ from __future__ import absolute_import
 # Thanks a bunch!
 #
 import time
+import datetime
+from collections import OrderedDict
 
 from astro import core
+from astro.precise import precise_position
+
+try:
+	import numpy
+except ImportError:					# optional; we'll do it the slow way
+	numpy = None
 
 DEBUG = None
 
@@ -57,10 +65,15 @@ EARTH = Planet("Earth",
 # Geographic locations
 #
 class SunLocation(core.Location):
-	""" Hold a terrestrial position (latitude, longitude), West positive. """
-	def __init__(self, lat, lon=None, planet=EARTH):
+	""" Hold a terrestrial position (latitude, longitude), West positive.
+
+		Precise selects the higher-precision solar model of astro.precise
+		(Earth only) for positions at this location.
+	"""
+	def __init__(self, lat, lon=None, planet=EARTH, precise=False):
 		super(SunLocation, self).__init__(lat=lat, lon=lon)
 		self.planet = planet
+		self.precise = precise
 
 		# pre-calculate
 		self.lat_sin = sin(lat)
@@ -92,6 +105,8 @@ J2000 = 2451545					# Year 2000 Julian epoch
 #
 def sun_position(unixtime, location):
 	""" Calculate the horizon coordinates of the Sun at a given time and location. """
+	if location.precise:
+		return precise_position(unixtime, location)
 	p = location.planet
 
 	#
@@ -122,6 +137,237 @@ def sun_position(unixtime, location):
 	return (A, h)		# ascension, height
 
 
+#
+# Calculate many solar positions at once.
+#
+# This is the same model as sun_position, applied to a sequence of times.
+# With NumPy around, the whole batch is computed array-wise; otherwise we
+# loop in plain Python, but at least skip all the per-call overhead.
+#
+def sun_positions(unixtimes, locations):
+	""" Calculate horizon coordinates of the Sun for a sequence of times.
+
+		Locations is either one SunLocation for all times, or a sequence of them
+		as long as unixtimes (all on the same planet). Returns a pair of sequences
+		(azimuths, heights) - NumPy arrays if NumPy is available, else lists.
+	"""
+	if isinstance(locations, SunLocation):
+		if locations.precise:		# time terms are cached; no batch shortcut needed
+			return _positions_precise(unixtimes, [locations] * len(unixtimes))
+		planet = locations.planet
+		lat_sin, lat_cos, lon = locations.lat_sin, locations.lat_cos, locations.lon
+	else:
+		if len(locations) != len(unixtimes):
+			raise ValueError("need one location per time")
+		planet = locations[0].planet if locations else EARTH
+		if any(loc.planet is not planet for loc in locations):
+			raise ValueError("locations must all be on the same planet")
+		if any(loc.precise for loc in locations):
+			return _positions_precise(unixtimes, locations)
+		lat_sin = [loc.lat_sin for loc in locations]
+		lat_cos = [loc.lat_cos for loc in locations]
+		lon = [loc.lon for loc in locations]
+	if numpy is not None:
+		return _positions_numpy(unixtimes, planet, lat_sin, lat_cos, lon)
+	if isinstance(locations, SunLocation):
+		n = len(unixtimes)
+		(lat_sin, lat_cos, lon) = ([lat_sin] * n, [lat_cos] * n, [lon] * n)
+	return _positions_python(unixtimes, planet, lat_sin, lat_cos, lon)
+
+
+def _positions_precise(unixtimes, locations):
+	positions = [sun_position(t, loc) for (t, loc) in zip(unixtimes, locations)]
+	return ([A for (A, h) in positions], [h for (A, h) in positions])
+
+
+def _positions_numpy(unixtimes, p, lat_sin, lat_cos, lon):
+	np = numpy
+	rad = np.radians
+	J = np.asarray(unixtimes, dtype=float) / 86400.0 + 2440587.5
+	lat_sin = np.asarray(lat_sin, dtype=float)
+	lat_cos = np.asarray(lat_cos, dtype=float)
+	lon = np.asarray(lon, dtype=float)
+
+	M = p.M0 + p.M1 * (J - J2000)
+	C = np.zeros_like(J)
+	for i, cn in enumerate(p.Cn):
+		if cn:
+			C += cn * np.sin(rad((i+1) * M))
+	l_sun = M + p.EL + C + 180
+	sin_l = np.sin(rad(l_sun))
+
+	alpha_sun = l_sun + p.A2 * np.sin(rad(2 * l_sun)) + p.A4 * np.sin(rad(4 * l_sun)) + p.A6 * np.sin(rad(6 * l_sun))
+	delta_sun = rad(p.D1 * sin_l + p.D3 * sin_l**3 + p.D5 * sin_l**5)
+	TH = p.TH0 + p.TH1 * (J - J2000) + lon
+
+	H = rad((TH - alpha_sun) % 360)
+	A = np.degrees(np.arctan2(np.sin(H), np.cos(H) * lat_sin - np.tan(delta_sun) * lat_cos))
+	h = np.degrees(np.arcsin(lat_sin * np.sin(delta_sun) + lat_cos * np.cos(delta_sun) * np.cos(H)))
+	return (A, h)
+
+
+def _positions_python(unixtimes, p, lat_sins, lat_coss, lons):
+	from math import sin, cos, tan, atan2, asin, radians, degrees
+	Cn = [(i+1, cn) for i, cn in enumerate(p.Cn) if cn]
+	azimuths = []
+	heights = []
+	for (t, lat_sin, lat_cos, lon) in zip(unixtimes, lat_sins, lat_coss, lons):
+		J = t / 86400.0 + 2440587.5
+		M = p.M0 + p.M1 * (J - J2000)
+		C = 0
+		for (k, cn) in Cn:
+			C += cn * sin(radians(k * M))
+		l_sun = M + p.EL + C + 180
+		sin_l = sin(radians(l_sun))
+
+		alpha_sun = l_sun + p.A2 * sin(radians(2 * l_sun)) + p.A4 * sin(radians(4 * l_sun)) + p.A6 * sin(radians(6 * l_sun))
+		delta_sun = radians(p.D1 * sin_l + p.D3 * sin_l**3 + p.D5 * sin_l**5)
+		TH = p.TH0 + p.TH1 * (J - J2000) + lon
+
+		H = radians((TH - alpha_sun) % 360)
+		azimuths.append(degrees(atan2(sin(H), cos(H) * lat_sin - tan(delta_sun) * lat_cos)))
+		heights.append(degrees(asin(lat_sin * sin(delta_sun) + lat_cos * cos(delta_sun) * cos(H))))
+	return (azimuths, heights)
+
+
+#
+# Sun events: when does the Sun cross a given height on a given day?
+#
+# A "day" here is the local solar day: the 24 hours centered on mean local noon
+# of a calendar date at the location's longitude. Within it, the Sun rises
+# toward its culmination (noon) and then sets again, so each height is crossed
+# at most once going up (before noon) and once going down (after noon).
+# We sample the day coarsely in one batch, then bisect crossings down to a second.
+# Heights here are true (geometric) heights, in either model: the event heights
+# below already allow for refraction, which must not be counted twice.
+#
+SUNRISE = -0.833			# upper limb at the (refracted) horizon
+CIVIL_TWILIGHT = -6
+NAUTICAL_TWILIGHT = -12
+ASTRONOMICAL_TWILIGHT = -18
+
+EVENT_STEP = 10 * 60		# sampling step (seconds)
+EVENT_PRECISION = 1			# crossing times are good to this many seconds
+DAY_CACHE = 32				# number of SunDays we remember
+
+
+def solar_day(location, date):
+	""" The (start, end) UNIX times of the mean solar day of date at location. """
+	midday = datetime.datetime(date.year, date.month, date.day, 12, tzinfo=datetime.timezone.utc).timestamp()
+	start = midday - location.lon / 15.0 * 3600 - 43200	# mean local midnight
+	return (start, start + 86400)
+
+def local_date(location, unixtime):
+	""" The date at location by mean solar time at unixtime.
+		(There is no default: pass the caller's idea of now, such as Controller.time().)
+	"""
+	return datetime.datetime.utcfromtimestamp(unixtime + location.lon / 15.0 * 3600).date()
+
+
+class SunDay(object):
+	""" The Sun's daily course for a SunLocation and date.
+
+		Noon is the time of culmination, with noon_height the Sun's height then.
+		Crossing(height) returns (rising, setting) UNIX times at which the Sun
+		passes that height, either of which is None if it doesn't happen that day
+		(polar days and nights). Results are remembered, so asking again is free.
+		Get these from sun_day(), which caches them per (location, date).
+		Heights are true heights, without refraction (even for precise locations).
+	"""
+	def __init__(self, location, date):
+		self.location = location
+		self.date = date
+		(self.start, self.end) = solar_day(location, date)
+		self._times = [self.start + n * EVENT_STEP for n in range(86400 // EVENT_STEP + 1)]
+		if location.precise:
+			self._heights = [self._height(t) for t in self._times]
+		else:
+			self._heights = list(sun_positions(self._times, location)[1])
+		self._crossings = { }
+
+		# find culmination: best sample, then golden-section search around it
+		peak = max(range(len(self._heights)), key=self._heights.__getitem__)
+		self.noon = self._maximize(self._times[max(peak-1, 0)], self._times[min(peak+1, len(self._times)-1)])
+		self.noon_height = self._height(self.noon)
+
+	@property
+	def sunrise(self):
+		return self.crossing(SUNRISE)[0]
+
+	@property
+	def sunset(self):
+		return self.crossing(SUNRISE)[1]
+
+	def dawn(self, height=CIVIL_TWILIGHT):
+		return self.crossing(height)[0]
+
+	def dusk(self, height=CIVIL_TWILIGHT):
+		return self.crossing(height)[1]
+
+	def crossing(self, height):
+		""" (rising, setting) times for height, or None for either that doesn't happen. """
+		if height not in self._crossings:
+			self._crossings[height] = (self._search(height, rising=True), self._search(height, rising=False))
+		return self._crossings[height]
+
+	def _search(self, height, rising):
+		""" Find the crossing closest to noon on one side of it. """
+		samples = [(t, h) for (t, h) in zip(self._times, self._heights) if (t < self.noon) == rising]
+		if rising:		# scan back from noon
+			samples = [(self.noon, self.noon_height)] + samples[::-1]
+		else:
+			samples = [(self.noon, self.noon_height)] + samples
+		for ((t0, h0), (t1, h1)) in zip(samples, samples[1:]):
+			if h0 >= height > h1:		# crossed between these (away from noon)
+				return self._bisect(min(t0, t1), max(t0, t1), height, rising)
+		return None
+
+	def _bisect(self, t0, t1, height, rising):
+		while t1 - t0 > EVENT_PRECISION:
+			mid = (t0 + t1) / 2
+			if (self._height(mid) < height) == rising:
+				t0 = mid
+			else:
+				t1 = mid
+		return (t0 + t1) / 2
+
+	def _maximize(self, t0, t1):
+		g = (math.sqrt(5) - 1) / 2
+		while t1 - t0 > EVENT_PRECISION:
+			a = t1 - g * (t1 - t0)
+			b = t0 + g * (t1 - t0)
+			if self._height(a) < self._height(b):
+				t0 = a
+			else:
+				t1 = b
+		return (t0 + t1) / 2
+
+	def _height(self, t):
+		if self.location.precise:
+			return precise_position(t, self.location, refract=False)[1]
+		return sun_position(t, self.location)[1]
+
+	def __repr__(self):
+		return "<SunDay %s %s noon %s>" % (self.location, self.date, time.ctime(self.noon))
+
+
+_days = OrderedDict()
+
+def sun_day(location, date):
+	""" Get the SunDay for a location and date. Cached.
+		For "today there", pass local_date(location, now).
+	"""
+	key = (location.lat, location.lon, location.planet.name, location.precise, date)
+	day = _days.get(key)
+	if day is None:
+		day = _days[key] = SunDay(location, date)
+		if len(_days) > DAY_CACHE:
+			_days.popitem(last=False)	# forget oldest
+	else:
+		_days.move_to_end(key)
+	return day
+
+
 #
 # Test
 #
@@ -146,5 +392,42 @@ if __name__ == "__main__":
 			print("BAD COMPARE!")
 		else:
 			print("Regression OK.")
+		# batched calculation must match, for a day around the regression point
+		times = [ts + step * 600 for step in range(-72, 72)]
+		places = [SunLocation(lat=52 - step % 7, lon=5 + step % 11) for step in range(len(times))]
+		for locs in (pos, places):
+			(As, hs) = sun_positions(times, locs)
+			for (i, t) in enumerate(times):
+				(A, h) = sun_position(t, pos if locs is pos else locs[i])
+				if abs(As[i] - A) > 1e-9 or abs(hs[i] - h) > 1e-9:
+					print("BAD BATCH COMPARE at", t, (As[i], hs[i]), "vs", (A, h))
+					break
+			else:
+				continue
+			break
+		else:
+			print("Batch regression OK.")
+		# sun events on the regression day (Amsterdam-ish: rise ~05:15, set ~18:15 UTC)
+		day = sun_day(pos, datetime.date(2004, 4, 1))
+		rise, set = day.sunrise, day.sunset
+		if (abs(sun_position(rise, pos)[1] - SUNRISE) > 0.01 or abs(sun_position(set, pos)[1] - SUNRISE) > 0.01
+				or not (day.dawn() < rise < day.noon < set < day.dusk())
+				or abs(rise - 1080796500) > 600 or abs(set - 1080843300) > 600
+				or sun_day(pos, datetime.date(2004, 4, 1)) is not day
+				or sun_day(SunLocation(lat=80, lon=5), datetime.date(2004, 6, 21)).sunset is not None):
+			print("BAD EVENTS!", time.ctime(rise), time.ctime(set))
+		else:
+			print("Events regression OK.")
+		# precise days are separate, and their events are at the same (true) heights
+		exact = SunLocation(lat=52, lon=5, precise=True)
+		pday = sun_day(exact, datetime.date(2004, 4, 1))
+		true_height = lambda t: precise_position(t, exact, refract=False)[1]
+		if (pday is day or sun_day(exact, datetime.date(2004, 4, 1)) is not pday
+				or abs(true_height(pday.sunrise) - SUNRISE) > 0.01 or abs(true_height(pday.sunset) - SUNRISE) > 0.01
+				or abs(true_height(pday.dawn()) - CIVIL_TWILIGHT) > 0.01
+				or abs(pday.sunrise - rise) > 120 or abs(pday.sunset - set) > 120):
+			print("BAD PRECISE EVENTS!", time.ctime(pday.sunrise), time.ctime(pday.sunset))
+		else:
+			print("Precise events regression OK.")
 	else:
 		print("Ascension", A, "height", h)
@@ -8,9 +8,12 @@ import threading
 import time
 
 import asyn
+import asyn.clock
 import asyn.controller
 import asyn.inject
+import asyn.poller
 import asyn.resolve
+import asyn.selectable
 
 
 print('asyn.controller regression starting (this will take several seconds)...')
@@ -87,80 +90,398 @@ assert time.time() - started < 2.1	# broke the select loop properly
 #
 # Test a mix of TCP connects, UDP messaging, and timers
 #
-print('(TCP/UDP messaging)')
-control = asyn.Controller()
+def messaging(poller):
+	print(f'(TCP/UDP messaging, {poller.name})')
+	control = asyn.Controller(poller=poller)
 
-# test a mix of TCP connects, UDP messaging, and timers
-tcp_schedule = [0.1, 0.9, 1, 1, 1.1, 1.11]
-LIMIT=2 # seconds
-PORT=55072
-check = { 'tcp': 0 }
-
-res_clnt = socket.getaddrinfo('localhost', PORT, 0, socket.SOCK_STREAM)
-class Client(object):
-	def __init__(self, ctx, socket=None):
-		if ctx.state == 'connected':
-			self.stream = control.stream(socket, callout=self.cb)
-			self.stream.write(b'Hello, server!\n')
-		elif ctx.state == 'CLOSE':
-			pass
-		else:
-			print('CLIENT CONNECT UNEXPECTED', ctx)
-	def cb(self, ctx, data=None):
-		if ctx.state == 'RAW':
-			if data == b'Hello, server!\n':
-				self.stream.write(b'Good bye!\n')
-			elif data == b'Good bye!\n':
-				check['tcp'] += 1
-				self.stream.close()
+	# test a mix of TCP connects, UDP messaging, and timers
+	tcp_schedule = [0.1, 0.9, 1, 1, 1.1, 1.11]
+	LIMIT=2 # seconds
+	PORT=55072 + asyn.poller.POLLERS.index(poller)
+	check = { 'tcp': 0 }
+
+	res_clnt = socket.getaddrinfo('localhost', PORT, 0, socket.SOCK_STREAM)
+	class Client(object):
+		def __init__(self, ctx, socket=None):
+			if ctx.state == 'connected':
+				self.stream = control.stream(socket, callout=self.cb)
+				self.stream.write(b'Hello, server!\n')
+			elif ctx.state == 'CLOSE':
+				pass
+			else:
+				print('CLIENT CONNECT UNEXPECTED', ctx)
+		def cb(self, ctx, data=None):
+			if ctx.state == 'RAW':
+				if data == b'Hello, server!\n':
+					self.stream.write(b'Good bye!\n')
+				elif data == b'Good bye!\n':
+					check['tcp'] += 1
+					self.stream.close()
+				else:
+					print(f'UNEXPECTED RAW DATA {data=}')
+			elif ctx.state == 'CLOSE':
+				pass
+			else:
+				print('CLIENT UNEXPECTED', ctx)
+	for delay in tcp_schedule:
+		control.schedule(lambda ctx: control.connector(res_clnt, callout=Client), after=delay)
+
+	def connect_server(ctx, socket=None):
+		def do_server(ctx, data=None):
+			if ctx.state == 'END':
+				con.shutdown()
+			elif ctx.state == 'RAW':
+				con.write(data)	# echo back to client
+			elif ctx.state == 'CLOSE':
+				pass
 			else:
-				print(f'UNEXPECTED RAW DATA {data=}')
+				print('SERVER UNEXPECTED', ctx)
+		if ctx.state == 'accept':
+			con = control.stream(socket, callout=do_server)
 		elif ctx.state == 'CLOSE':
 			pass
 		else:
-			print('CLIENT UNEXPECTED', ctx)
-for delay in tcp_schedule:
-	control.schedule(lambda ctx: control.connector(res_clnt, callout=Client), after=delay)
-
-def connect_server(ctx, socket=None):
-	def do_server(ctx, data=None):
-		if ctx.state == 'END':
-			con.shutdown()
-		elif ctx.state == 'RAW':
-			con.write(data)	# echo back to client
+			print('SERVER ACCEPT UNEXPECTED', ctx)
+
+	res_svr = socket.getaddrinfo('localhost', PORT, 0, socket.SOCK_STREAM, 0, socket.AI_PASSIVE)
+	server = control.listener(res_svr, callout=connect_server)
+	control.schedule(lambda ctx: server.close(), after=LIMIT)
+
+	def cb_dgram(ctx, data=None):
+		if ctx.state == 'DGRAM':
+			assert data == b'Walla Walhalla!'
 		elif ctx.state == 'CLOSE':
 			pass
 		else:
-			print('SERVER UNEXPECTED', ctx)
-	if ctx.state == 'accept':
-		con = control.stream(socket, callout=do_server)
-	elif ctx.state == 'CLOSE':
-		pass
-	else:
-		print('SERVER ACCEPT UNEXPECTED', ctx)
-
-res_svr = socket.getaddrinfo('localhost', PORT, 0, socket.SOCK_STREAM, 0, socket.AI_PASSIVE)
-server = control.listener(res_svr, callout=connect_server)
-control.schedule(lambda ctx: server.close(), after=LIMIT)
-
-def cb_dgram(ctx, data=None):
-	if ctx.state == 'DGRAM':
-		assert data == b'Walla Walhalla!'
-	elif ctx.state == 'CLOSE':
-		pass
-	else:
-		print('DGRAM UNEXPECTED', ctx)
-
-res_dgram = socket.getaddrinfo('localhost', PORT, 0, socket.SOCK_DGRAM)[0]
-sd = socket.socket(res_dgram[0], res_dgram[1], res_dgram[2])
-sd.bind(res_dgram[4])
-dgram = control.datagram(sd, callout=cb_dgram)
-for delay in [0, 0, 0, 0.7, 1.1, 1.1]:
-	control.schedule(lambda ctx: dgram.write(b'Walla Walhalla!', res_dgram[4]), after=delay)
-control.schedule(lambda ctx: control.close(), after=LIMIT)
+			print('DGRAM UNEXPECTED', ctx)
+
+	res_dgram = socket.getaddrinfo('localhost', PORT, 0, socket.SOCK_DGRAM)[0]
+	sd = socket.socket(res_dgram[0], res_dgram[1], res_dgram[2])
+	sd.bind(res_dgram[4])
+	dgram = control.datagram(sd, callout=cb_dgram)
+	for delay in [0, 0, 0, 0.7, 1.1, 1.1]:
+		control.schedule(lambda ctx: dgram.write(b'Walla Walhalla!', res_dgram[4]), after=delay)
+	control.schedule(lambda ctx: control.close(), after=LIMIT)
+
+	control.run()
+	assert check['tcp'] == len(tcp_schedule)
+
+for poller in asyn.poller.POLLERS:
+	messaging(poller)
+
+
+
+#
+# Idle Selectables should cost nothing per loop; periodic callouts are rate-limited
+#
+print('(interest tracking)')
+control = asyn.Controller(periodic_interval=0.1)
+asked = { 'wants': 0 }
+
+class Counted(asyn.selectable.Stream):
+	def _wants_read(self):
+		asked['wants'] += 1
+		return asyn.selectable.Stream._wants_read(self)
+
+IDLE = 100
+pairs = [socket.socketpair() for n in range(IDLE)]
+idlers = [Counted(control, a, callout=lambda ctx, data=None: None) for (a, b) in pairs]
+(ping_a, ping_b) = socket.socketpair()
+pings = { 'count': 0 }
+def pinged(ctx, data=None):
+	if ctx.state == 'RAW':
+		pings['count'] += 1
+pinger = control.stream(ping_a, callout=pinged)
+def ping(ctx):
+	ping_b.send(b'ping')
+	ctx.reschedule(ctx.when + 0.01)
+control.schedule(ping)
+periodics = []
+control.periodic.add_callout(lambda ctx: periodics.append(time.time()))
+control.schedule(lambda ctx: control.close(), after=1)
+control.run()
+for (a, b) in pairs:
+	b.close()
+ping_b.close()
+assert pings['count'] > 50					# the loop went around plenty...
+assert asked['wants'] < 2 * IDLE			# ... but didn't keep asking the idle ones
+assert 5 <= len(periodics) <= 11			# ~ every 0.1s
+assert min(b - a for (a, b) in zip(periodics, periodics[1:])) > 0.099
+
+
+
+#
+# Timers: ordering, cancellation, rescheduling, queue compaction - and speed
+#
+print('(timers)')
+control = asyn.Controller()
+fired = []
+base = time.time()
+for n in range(10):
+	control.schedule(lambda ctx, n=n: fired.append(n), at=base + (n % 3) * 0.01)
+doomed = [control.schedule(lambda ctx: fired.append('cancelled'), after=0.01) for n in range(1000)]
+for sched in doomed:
+	sched.cancel()
+assert len(control._schedq) < 1000				# compacted along the way
+moved = control.schedule(lambda ctx: fired.append('moved'), after=10)
+control.schedule(moved, after=0.05)				# move it up; must fire once
+control.schedule(lambda ctx: control.stop(), after=0.1)
+control.run()
+assert fired == [0, 3, 6, 9, 1, 4, 7, 2, 5, 8, 'moved'], fired
+assert control._scheddead == len(control._schedq) == 1	# (moved's original entry)
+
+COUNT = 100000
+def tick(ctx):
+	pass
+start = time.time()
+for n in range(COUNT):
+	control.schedule(tick, at=base)
+control.schedule(lambda ctx: control.stop())
+control.TIMERLIMIT = COUNT + 1
+control.run()
+fire_rate = COUNT / (time.time() - start)
+start = time.time()
+for n in range(COUNT):
+	control.schedule(tick, after=60).cancel()
+cancel_rate = COUNT / (time.time() - start)
+assert len(control._schedq) <= 2 * control.COMPACT_MIN
+print(f'  {fire_rate:.0f} timers/second scheduled and fired, {cancel_rate:.0f} scheduled and cancelled')
+
+
 
+#
+# Clocks: at= is wall-clock time, even across wall clock jumps;
+# a virtual clock runs a week of timers in no time
+#
+print('(clocks)')
+control = asyn.Controller()
+assert isinstance(control.clock, asyn.clock.MonotonicClock)
+sched = control.schedule(lambda ctx: None, at=control.time() + 3600)
+assert abs(control._schedq[0][0] - (control.clock.monotonic() + 3600)) < 0.1
+sched.cancel()
+
+class SteppedClock(asyn.clock.VirtualClock):
+	""" A virtual clock whose wall time can be stepped (NTP, or a sleep monotonic time didn't count). """
+	step = 0
+	def time(self):
+		return self._now + self.step
+
+START = 1080820800									# 2004-04-01 12:00 UTC
+clock = SteppedClock(start=START)
+control = asyn.Controller(clock=clock)
+fired = { }
+def note(name):
+	def fire(ctx):
+		fired[name] = (ctx.when, ctx.now, clock.monotonic())
+	return fire
+def step(seconds):
+	def jump(ctx):
+		clock.step += seconds
+	return jump
+control.schedule(note('at'), at=START + 3600)				# wall-clock: fires at 13:00 wall time
+control.schedule(note('after'), after=3600)					# relative: fires an hour of monotonic time later
+control.schedule(note('back'), at=START + 7200)
+control.schedule(note('cancelled'), at=START + 5000).cancel()
+control.schedule(step(1200), after=600)						# wall clock jumps 20 minutes ahead...
+control.schedule(step(-1800), after=3000)					# ... and later 30 minutes back
+control.schedule(lambda ctx: control.stop(), after=3 * 3600)
+control.run()
+assert fired['at'] == (START + 3600, START + 3600, START + 2400), fired
+assert fired['after'] == (START + 3600, START + 3600 + 1200 - 1800, START + 3600), fired	# (when was predicted)
+assert fired['back'] == (START + 7200, START + 7200, START + 7800), fired
+assert 'cancelled' not in fired and control._schedwall == 0
+
+WEEK = 7 * 86400
+clock = asyn.clock.VirtualClock(start=START)
+control = asyn.Controller(clock=clock)
+seen = { 'polls': 0, 'retries': 0, 'days': 0 }
+def poll(ctx):										# every 10 minutes, drift-free
+	seen['polls'] += 1
+	ctx.reschedule(after=600)
+def flaky(ctx):										# retry every 37s; each retry cancels and re-arms
+	seen['retries'] += 1
+	timers['retry'].cancel()
+	timers['retry'] = control.schedule(flaky, after=37)
+def daily(ctx):										# wall-clock events, one per day
+	seen['days'] += 1
+	assert ctx.now == ctx.when
+	control.schedule(daily, at=ctx.when + 86400)
+timers = { 'retry': control.schedule(flaky, after=37) }
+control.schedule(poll, after=600)
+control.schedule(daily, at=clock.time() + 3600)
+control.schedule(lambda ctx: control.stop(), after=WEEK)
+started = time.time()
+control.run()
+assert clock.time() == START + WEEK
+assert seen == { 'polls': WEEK // 600 - 1, 'retries': WEEK // 37, 'days': 7 }, seen	# (last poll ties with stop, which was queued first)
+assert time.time() - started < 5
+print(f'  simulated a week ({sum(seen.values())} timer callouts) in {time.time() - started:.2f} seconds')
+
+
+
+#
+# Instrumentation: loop, lateness and callout statistics; slow callout reports
+#
+print('(instrumentation)')
+control = asyn.Controller(slow_callout=0.05)
+slow = []
+control.slow.add_callout(lambda ctx: slow.append((ctx.name, ctx.duration)))
+def dawdle(ctx):
+	time.sleep(0.06)
+def quick(ctx):
+	pass
+control.schedule(dawdle, after=0.01)
+for n in range(10):
+	control.schedule(quick, after=0.02 + n * 0.01)
+control.schedule(lambda ctx: control.stop(), after=0.2)
+control.run()
+stats = control.statistics(reset=True)
+assert [name for (name, duration) in slow] == ['__main__.dawdle'] and slow[0][1] >= 0.06, slow
+assert stats['callouts']['__main__.quick']['count'] == 10
+assert stats['callouts']['__main__.dawdle']['max'] >= 0.06
+assert stats['lateness']['count'] == 12 and stats['lateness']['max'] >= 0.05	# quick ones queued up behind dawdle
+assert stats['iterations'] > 0 and stats['wait'] > 0.1 and stats['busy'] >= 0.06
+assert control.statistics()['iterations'] == 0
+assert asyn.Controller(instrument=False).statistics() is None
+
+rates = { }
+for instrument in (False, True):
+	control = asyn.Controller(instrument=instrument)
+	control.TIMERLIMIT = COUNT + 1
+	start = time.time()
+	for n in range(COUNT):
+		control.schedule(tick)
+	control.schedule(lambda ctx: control.stop())
+	control.run()
+	rates[instrument] = COUNT / (time.time() - start)
+print(f'  {rates[False]:.0f} timers/second uninstrumented, {rates[True]:.0f} instrumented')
+
+
+
+#
+# Thread pool: results come home on the controller thread; cancel; pool size
+#
+print('(thread pool)')
+control = asyn.inject.Controller(pool_size=2)
+home = threading.get_ident()
+outcomes = { }
+running = { 'now': 0, 'most': 0 }
+def work(n, delay=0.1):
+	running['now'] += 1
+	running['most'] = max(running['most'], running['now'])
+	time.sleep(delay)
+	running['now'] -= 1
+	if n == 'bad':
+		raise ValueError(n)
+	return n * 2
+def outcome(n):
+	def done(ctx, result=None):
+		assert threading.get_ident() == home
+		outcomes[n] = 'error' if ctx.error else result if ctx.state == 'result' else ctx.state
+	return done
+ticks = []
+def ticker(ctx):
+	ticks.append(ctx.now)
+	ctx.reschedule(after=0.02)
+control.schedule(ticker)
+for n in range(4):
+	control.submit(work, n, callout=outcome(n))
+control.submit(work, 'bad', delay=0, callout=outcome('bad'))
+doomed = control.submit(work, 99, callout=outcome(99))
+control.schedule(lambda ctx: doomed.cancel(), after=0.05)		# still queued behind the others
+control.schedule(lambda ctx: control.close(), after=0.5)
+control.run()
+assert outcomes == { 0: 0, 1: 2, 2: 4, 3: 6, 'bad': 'error', 99: 'CANCELLED' }, outcomes
+assert running['most'] == 2
+assert len(ticks) > 15							# the loop kept going while the pool worked
+
+
+
+#
+# Process pool: results, errors, crashes, timeouts, big replies, parallelism
+#
+print('(process pool)')
+import os
+import asyn.procpool
+import asyn.scan
+
+class Framed(asyn.Callable, asyn.scan.Scannable):		# frames arriving in pieces of any size
+	def __init__(self):
+		asyn.Callable.__init__(self, callout=lambda ctx, frame: frames.append(frame))
+		asyn.scan.Scannable.__init__(self)
+		self.scan = asyn.scan.LengthPrefix()
+payloads = [b'', b'a', b'hello' * 1000, bytes(range(256)) * 4000]
+stream = b''.join(asyn.scan.LengthPrefix.frame(payload) for payload in payloads)
+for piece in (len(stream), 1, 3, 4, 7, 4096):
+	frames = []
+	target = Framed()
+	for pos in range(0, len(stream), piece):
+		target._scan(stream[pos:pos+piece])
+	assert frames == payloads and target._rbuf == b'', piece
+frames = []
+target = Framed()
+huge = asyn.scan.LengthPrefix.frame(b'y' * 20000000)
+start = time.time()
+for pos in range(0, len(huge), 8192):					# linear, not quadratic, in the frame size
+	target._scan(huge[pos:pos+8192])
+assert len(frames) == 1 and len(frames[0]) == 20000000 and time.time() - start < 1
+asyn.procpool.YOUNG = 0						# (restart crashed workers right away)
+
+def square(n):
+	return n * n
+def fail(n):
+	raise ValueError(n)
+def crash(n):
+	os._exit(n)
+def stall(n):
+	time.sleep(n)
+def big(n):
+	return b'x' * n
+def spin(n):
+	return sum(range(n))
+
+control = asyn.Controller()
+pool = asyn.procpool.ProcessPool(control, size=2, timeout=1)
+pids = set(worker.pid for worker in pool.workers)
+outcomes = { }
+finished = { }
+def outcome(key):
+	def done(ctx, result=None):
+		outcomes[key] = (type(ctx.error).__name__) if ctx.error else result
+		finished[key] = time.time()
+	return done
+for n in range(10):
+	pool.submit(square, n, callout=outcome(n))
+pool.submit(fail, 'oops', callout=outcome('fail'))
+pool.submit(crash, 3, callout=outcome('crash'))
+pool.submit(stall, 5, callout=outcome('stall'))
+pool.submit(big, 5000000, callout=outcome('big'))
+for n in range(10, 20):
+	pool.submit(square, n, callout=outcome(n))
+def parallel(ctx):							# once the dust has settled
+	finished['parallel'] = time.time()
+	for n in range(2):
+		pool.submit(spin, 10000000, callout=outcome('spin%d' % n))
+control.schedule(parallel, after=2)
+control.schedule(lambda ctx: control.stop(), after=5)
 control.run()
-assert check['tcp'] == len(tcp_schedule)
+start = time.time()
+spin(10000000)
+serial = time.time() - start
+parallel = max(finished['spin0'], finished['spin1']) - finished['parallel']
+assert all(outcomes[n] == n * n for n in range(20)), outcomes
+assert outcomes['fail'] == 'ValueError'
+assert outcomes['crash'] == 'WorkerError' and outcomes['stall'] == 'WorkerError'
+assert outcomes['big'] == b'x' * 5000000
+assert outcomes['spin0'] == outcomes['spin1'] == sum(range(10000000))
+if (os.cpu_count() or 1) > 1:
+	assert parallel < 1.5 * serial, (parallel, serial)
+assert pool.restarts == 2 and len(pool.workers) == 2
+assert all(worker['state'] == 'idle' for worker in pool.health())
+assert len(pids & set(worker.pid for worker in pool.workers)) == 0	# both replaced
+pool.close()
+control.close()
+print(f'  one job: {serial:.2f} seconds; two jobs in parallel: {parallel:.2f} seconds')
 
 
 print('asyn.controller regression passed')
@@ -112,7 +112,7 @@ class Lookout(asyn.Callable):
 			json, xml, plists, or such.
 		"""
 		return dict(
-			when=time.time(),
+			when=self.control.time(),
 			devices=[dev.save_state() for dev in self.devices.values()]
 		)
 
@@ -158,7 +158,7 @@ class Lookout(asyn.Callable):
 				dev = Device(desc, ctx.source)
 				self.devices[uuid] = dev
 				self.callout('new', dev)
-			dev.last = time.time()
+			dev.last = self.control.time()
 			self._reschedule()
 		elif ctx.state == 'CLOSE':
 			self._dev = None
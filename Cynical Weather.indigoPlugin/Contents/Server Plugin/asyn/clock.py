@@ -0,0 +1,111 @@
+#
+# asyn.clock - time sources for Controller
+#
+# Copyright 2023 Perry The Cynic. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#	http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# A Clock tells a Controller what time it is, two ways:
+#  * monotonic() is what timers run on. It never jumps, so a timer set to fire
+#    in ten minutes does so in ten minutes, whatever happens to the wall clock.
+#  * time() is wall-clock (UNIX epoch) time. Scheduling at= an absolute time,
+#    Scheduled.when, and the TIMER context's when and now are all wall-clock.
+#    The Controller keeps at= timers on their wall-clock time if the wall clock
+#    jumps against monotonic(), or monotonic() stood still while we slept.
+# A Clock also does the Controller's waiting, which is what lets VirtualClock
+# skip idle time altogether.
+#
+import time
+
+DEBUG = None
+
+
+class Clock(object):
+	""" Abstract base of Controller clocks. """
+	name = None
+
+	def monotonic(self):
+		raise NotImplementedError
+
+	def time(self):
+		raise NotImplementedError
+
+	def wait(self, poller, timeout):
+		""" Wait for I/O on a Poller for up to timeout seconds (None = forever). """
+		return poller.poll(timeout)
+
+
+class MonotonicClock(Clock):
+	""" Real time. Relative (after=) timers are immune to wall clock changes
+		(NTP, manual setting); absolute (at=) ones follow them.
+
+		Note that on macOS the monotonic clock stands still while the system sleeps,
+		so relative timers stretch by the time spent asleep. (Absolute ones fire
+		on waking if they came due meanwhile.)
+	"""
+	name = 'monotonic'
+
+	monotonic = staticmethod(time.monotonic)
+	time = staticmethod(time.time)
+
+
+class WallClock(Clock):
+	""" Real time, with timers on the wall clock - jumps and all. """
+	name = 'wall'
+
+	monotonic = staticmethod(time.time)
+	time = staticmethod(time.time)
+
+
+class VirtualClock(Clock):
+	""" Simulated time. Whenever the Controller would wait for its next timer,
+		time jumps straight there instead; so timer-driven logic runs as fast as
+		the CPU allows. I/O still works (it's just never waited for while timers
+		are pending). Time starts at start (default: now) and only moves by
+		waiting or by calling advance().
+	"""
+	name = 'virtual'
+
+	def __init__(self, start=None):
+		self._now = time.time() if start is None else start
+
+	def monotonic(self):
+		return self._now
+
+	def time(self):
+		return self._now
+
+	def advance(self, seconds):
+		""" Move time forward. """
+		assert seconds >= 0
+		self._now += seconds
+
+	def wait(self, poller, timeout):
+		if timeout is None:				# no timers; only I/O can get us going again
+			return poller.poll(None)
+		(reads, writes) = poller.poll(0)
+		if not reads and not writes:
+			if DEBUG: DEBUG("virtual clock skips", timeout)
+			self._now += timeout
+		return (reads, writes)
+
+
+CLOCKS = [MonotonicClock, WallClock, VirtualClock]
+
+
+def clock_class(name=None):
+	""" Return the Clock class by name (default: monotonic). """
+	for cls in CLOCKS:
+		if cls.name == (name or 'monotonic'):
+			return cls
+	raise ValueError(f"unknown clock {name!r}")
@@ -17,16 +17,19 @@
 #
 import os
 import socket
-import select
 import fcntl
 import sys
-import time
 import heapq
+import itertools
+from time import perf_counter
 
 import asyn
 from asyn import core
 from asyn import selectable
 from asyn import resolve
+import asyn.poller
+import asyn.clock
+import asyn.stats
 
 DEBUG = None
 
@@ -49,9 +52,10 @@ class Controller(object):
 		They fire through callouts.
 
 		Controller also manages a single Controller.periodic callout that fires
-		whenever Controller gets around to it. Use this to perform cleanup work
-		or logging that has no time dependencies but needs to be done eventually.
-		There is no high or low bound on the time between period callouts.
+		whenever Controller gets around to it, but no more often than every
+		periodic_interval seconds. Use this to perform cleanup work or logging
+		that has no time dependencies but needs to be done eventually.
+		There is no high bound on the time between periodic callouts.
 
 		While Controller provides convenience methods for creating suitable
 		Selectable subclasses and servicing them, Selectables can also be
@@ -62,16 +66,67 @@ class Controller(object):
 		Controller lives in a single thread (the one that called its run() method).
 		If your program is multi-threaded, you want the asyn.inject.Controller
 		subclass that adds methods for shunting work onto that thread as needed.
+
+		I/O waiting is done by a Poller (see asyn.poller). Pass poller= a name
+		('epoll', 'poll', 'select') or Poller class to choose one; by default,
+		it's epoll on Linux and select elsewhere. Selectables tell the Controller
+		when their interest in reading or writing may have changed (see reconsider),
+		and only those are asked again and passed on to the Poller. An idle
+		Selectable thus costs nothing per loop.
+
+		Time comes from a Clock (see asyn.clock). Pass clock= a name ('monotonic',
+		'wall', 'virtual'), Clock class, or Clock instance. The default monotonic
+		clock keeps after= timers steady across wall clock jumps, while at= timers
+		follow the wall clock wherever it goes; a virtual clock runs
+		timer-driven code faster than real time (for testing). Use self.time()
+		rather than time.time() for wall-clock time that agrees with the Controller.
+
+		Unless told instrument=False, a Controller keeps statistics (see asyn.stats)
+		on its loop, timer lateness, and the time taken by each kind of callout.
+		Get them from statistics(). Any single callout taking slow_callout seconds
+		or longer is reported through the Controller.slow callout, with a 'SLOW'
+		Context carrying the callable's name and the duration.
 	"""
 	
 	TIMERLIMIT = 1000		# max # of back-to-back timer dispatches before taking a break
-
-	def __init__(self, **kwargs):
+	POLLER = None			# default poller (name or class; None for automatic)
+	PERIODIC_INTERVAL = 1	# default minimum seconds between periodic callouts
+	CLOCK = None			# default clock (name, class or instance; None for monotonic)
+	INSTRUMENT = True		# keep statistics by default
+	SLOW_CALLOUT = 0.5		# default slow callout report threshold (seconds)
+	WALL_SLACK = 0.1		# wall clock movement (seconds) that re-derives at= timer deadlines
+	WALL_CHECK = 60			# longest wait (seconds) without looking at the wall clock, while at= timers are pending
+
+	def __init__(self, poller=None, periodic_interval=None, clock=None,
+			instrument=None, slow_callout=SLOW_CALLOUT, **kwargs):
 		""" Make an empty, ready-to-use Controller. """
 		self._map = { }							# map of inserted Selectables
-		self._schedq = []						# scheduled timer tasks
+		self._schedq = []						# scheduled timer tasks (heap of entries)
+		self._schedseq = itertools.count()		# timer entry sequence numbers
+		self._scheddead = 0						# orphaned entries in _schedq
+		self._schedwall = 0						# live at= (wall-clock) entries in _schedq
 		self.periodic = asyn.Callable()			# irregular periodic callout
+		self.periodic_interval = self.PERIODIC_INTERVAL if periodic_interval is None else periodic_interval
+		self._periodic_last = None				# (monotonic) time of last periodic callout
 		self.running = False					# main run gate
+		poller = poller or self.POLLER
+		if poller is None or isinstance(poller, str):
+			poller = asyn.poller.poller_class(poller)
+		self._poller = poller()					# I/O readiness waiter
+		self._interest = { }					# fd -> (read, write) as told to _poller
+		self._dirty = set()						# Selectables whose interest may have changed
+		clock = clock or self.CLOCK
+		if not isinstance(clock, asyn.clock.Clock):
+			if clock is None or isinstance(clock, str):
+				clock = asyn.clock.clock_class(clock)
+			clock = clock()
+		self.clock = clock						# our sense of time
+		self._wall_offset = clock.time() - clock.monotonic()	# wall - monotonic (as of last re-derivation)
+		if instrument is None:
+			instrument = self.INSTRUMENT
+		self.stats = asyn.stats.Stats() if instrument else None	# loop statistics
+		self.slow = asyn.Callable()				# slow callout reports
+		self.slow_callout = slow_callout		# threshold for those (None to disable)
 
 	def close(self):
 		""" Shut down the entire Controller.
@@ -82,32 +137,127 @@ class Controller(object):
 		self.stop()
 		for item in list(self._map.values()):	# close all I/O dispatchers
 			item.close()
-		self._schedq = []						# clear timers
+		self._poller.close()
+		self._poller = type(self._poller)()		# (fresh one in case we're run again)
+		self._interest = { }
+		self._dirty = set()
+		for (_, _, sched) in self._schedq:		# clear timers
+			sched._entry = None
+		self._schedq = []
+		self._scheddead = 0
+		self._schedwall = 0
 		self.periodic.clear_callouts()			# clear periodic callouts
 
 
 	def run(self):
 		""" Run the Controller loop until .stop() is called on it. """
 		self.running = True
+		clock = self.clock
+		mark = perf_counter()
 		while self.running:
-			self.periodic.callout(ctx_periodic)
+			stats = self.stats
+			offset = clock.time() - clock.monotonic()
+			if abs(offset - self._wall_offset) > self.WALL_SLACK:	# wall clock jumped (or we slept)
+				self._wall_offset = offset
+				if self._schedwall:
+					self._rederive()
+			if self.periodic.has_callouts():
+				now = clock.monotonic()
+				if self._periodic_last is None or now - self._periodic_last >= self.periodic_interval:
+					self._periodic_last = now
+					self._timed('(periodic)', self.periodic.callout, ctx_periodic)
 			self._dispatch()
+			if not self.running:				# a timer stopped us; don't wait around
+				break
+			self._update_interest()
+			timeout = max(0, self._schedq[0][0] - clock.monotonic()) if self._schedq else None
+			if self._schedwall and (timeout is None or timeout > self.WALL_CHECK):
+				timeout = self.WALL_CHECK		# (so we notice the wall clock moving)
+			assert timeout or self._interest	# or else we're permanently stalled
+			if DEBUG: DEBUG(self._poller.name, timeout, self._interest)
+			if stats:
+				waiting = perf_counter()
+				stats.busy += waiting - mark
+			(reads, writes) = clock.wait(self._poller, timeout)
+			if stats:
+				mark = perf_counter()
+				stats.wait += mark - waiting
+				stats.iterations += 1
 			fds = self._map
-			reads = [item for item in fds.values() if item._wants_read()]
-			writes = [item for item in fds.values() if item._wants_write()]
-			timeout = max(0, self._schedq[0].when - time.time()) if self._schedq else None
-			assert timeout or reads or writes	# or else we're permanently stalled
-			if DEBUG: DEBUG("select", timeout, reads, writes)
-			(reads, writes, others) = select.select(reads, writes, [], timeout)
-			if DEBUG: DEBUG("selected", reads, writes)
+			reads = [fds[fd] for fd in reads if fd in fds]		# (resolve before any callouts)
+			writes = [fds[fd] for fd in writes if fd in fds]
+			if DEBUG: DEBUG("polled", reads, writes)
+			dirty = self._dirty
 			for item in reads:
 				if item.control:
-					item._can_read()
+					if item.is_plumbing:		# (times its own work, if any)
+						item._can_read()
+					else:
+						self._timed(None, item._can_read)
+					dirty.add(item)				# (reading may have changed its mind)
 			for item in writes:
 				if item.control:
-					item._can_write()
+					self._timed(None, item._can_write)
+					dirty.add(item)
 			self._dispatch()
 
+	def _timed(self, key, fn, *args, **kwargs):
+		""" Call fn(*args, **kwargs), recording its time under key (default: fn's name). """
+		stats = self.stats
+		if stats is None:
+			return fn(*args, **kwargs)
+		start = perf_counter()
+		try:
+			return fn(*args, **kwargs)
+		finally:
+			elapsed = perf_counter() - start
+			name = key if isinstance(key, str) else asyn.stats.callable_name(key or fn)
+			stats.record(name, elapsed)
+			if self.slow_callout is not None and elapsed >= self.slow_callout:
+				if DEBUG: DEBUG("slow callout", name, elapsed)
+				self.slow.callout(asyn.Context('SLOW', name=name, duration=elapsed))
+
+	def statistics(self, reset=False):
+		""" Return a snapshot of our loop statistics (a dict), or None if we don't keep any.
+
+			If reset is True, start counting afresh.
+		"""
+		if self.stats is None:
+			return None
+		snapshot = self.stats.snapshot()
+		if reset:
+			self.stats.reset()
+		return snapshot
+
+	def reconsider(self, selectable):
+		""" Note that a Selectable's _wants_read or _wants_write may have changed.
+
+			Selectables call this (through their _interest_changed method);
+			it is cheap, and calling it when nothing changed is harmless.
+		"""
+		self._dirty.add(selectable)
+
+	def _update_interest(self):
+		""" Bring the Poller up to date with what changed Selectables want. """
+		interest = self._interest
+		dirty = self._dirty
+		while dirty:
+			item = dirty.pop()
+			if item.control is not self:		# closed since
+				continue
+			fd = item.fileno()
+			want = (bool(item._wants_read()), bool(item._wants_write()))
+			if interest.get(fd, (False, False)) != want:
+				self._poller.set(fd, *want)
+				if any(want):
+					interest[fd] = want
+				else:
+					del interest[fd]
+
+	def time(self):
+		""" The current wall-clock (UNIX) time, as this Controller sees it. """
+		return self.clock.time()
+
 	def stop(self):
 		""" Stop running the Controller. Resume by calling run() again.
 
@@ -154,20 +304,44 @@ class Controller(object):
 		if DEBUG: DEBUG("insert", selectable.fileno(), selectable)
 		assert fd not in self._map
 		self._map[fd] = selectable
+		self._dirty.add(selectable)
 
 	def remove(self, selectable):
 		if DEBUG: DEBUG("remove", selectable.fileno(), selectable)
-		del self._map[selectable.fileno()]
+		fd = selectable.fileno()
+		del self._map[fd]
+		self._dirty.discard(selectable)
+		if self._interest.pop(fd, None):
+			self._poller.forget(fd)
 
 
 	#
-	# Simple timed scheduling
+	# Simple timed scheduling.
+	#
+	# Timers run on our clock's monotonic time; the API speaks wall-clock time.
+	# A Scheduled's when (and the TIMER context's when and now) are wall-clock.
+	# after= timers are relative, so their monotonic deadlines stay put whatever
+	# the wall clock does. at= timers are absolute: their deadlines are derived
+	# from when with the current wall - monotonic offset, and derived again
+	# whenever the loop sees that offset move (an NTP step, the clock being set,
+	# or waking from a sleep the monotonic clock didn't count). So they fire at
+	# their wall-clock time. (All at= deadlines share one offset, so equal at=
+	# times make equal deadlines.)
+	#
+	# The timer queue is a heap of (deadline, sequence, Scheduled) entries; the sequence
+	# number keeps equal times in FIFO order and spares us comparing Scheduled objects.
+	# A Scheduled knows its live entry. Cancelling (or rescheduling) it just orphans
+	# that entry, which is O(1); orphans are discarded as they reach the top of the
+	# heap, or all at once when they make up too much of it.
 	#
+	COMPACT_MIN = 64		# don't bother compacting the timer queue below this many dead entries
+	COMPACT_RATIO = 0.5		# compact when this fraction of the timer queue is dead
+
 	class Scheduled(core.Callable):
 		""" A time-scheduled callout.
 
 			This is a Callable that gets called based on time passing.
-			Scheduling is based on real time (UNIX epoch seconds).
+			Its when is the wall-clock time (UNIX epoch seconds) it is due.
 			Scheduled objects are created automatically by Controller.schedule(),
 			but can also be created explicitly (perhaps as subclasses) and submitted
 			to Controller.schedule() explicitly. They can also be rescheduled by
@@ -178,9 +352,15 @@ class Controller(object):
 			core.Callable.__init__(self, callback)
 			self.when = when
 			self.active = True
+			self._control = None		# Controller we were last queued in
+			self._entry = None			# our live entry in its queue (if any)
+			self._wall = False			# that entry follows the wall clock (at=)
 		def cancel(self):
 			""" Cancel the timer. Callout will not be made. """
 			self.active = False
+			if self._entry:
+				self._entry = None
+				self._control._orphaned(self)
 		def __lt__(self, other):
 			return self.when < other.when
 		def __repr__(self):
@@ -189,64 +369,133 @@ class Controller(object):
 			else:
 				return f'<Scheduled:DELETED:{self._callbacks}>'
 
+	class TimerContext(asyn.Context):
+		""" The Context of a Scheduled's callout.
+
+			Besides state 'TIMER', it carries sched (the Scheduled), control,
+			when (the scheduled time) and now (the actual time of the callout),
+			both wall-clock, and deadline (when, in the clock's monotonic time).
+			Its reschedule() method makes the Scheduled fire again, either at=
+			an absolute time or after= seconds from when it was due (without drift).
+		"""
+		def __init__(self, sched, control, when, now, deadline):
+			self.state = 'TIMER'
+			self.sched = sched
+			self.control = control
+			self.when = when
+			self.now = now
+			self.deadline = deadline
+		def reschedule(self, at=None, after=None):
+			if at:
+				self.control.schedule(self.sched, at)
+			elif after:
+				self.control._enqueue(self.sched, self.when + after, self.deadline + after)	# no-drift
+		def __repr__(self): return "<TIMER CTX:%r>" % self.sched
+
 	def schedule(self, entity, at=None, after=None):
 		""" Schedule a one-shot callback at a future time.
 
 			Entity may be an existing Scheduled object, or any callable to be wrapped
-			into a new Scheduled object as its callout.
-			Use at= for an absolute time, or after= for a relative (future) time.
+			into a new Scheduled object as its callout. Scheduling a Scheduled that is
+			already pending moves it to the new time.
+			Use at= for an absolute (wall-clock) time, which is kept even if the wall
+			clock jumps, or after= for a relative (future) time, which is not moved by that.
 			Either way, this returns a Scheduled object that you can use to cancel the timer.
 		"""
-		now = time.time()
+		offset = self._wall_offset
 		if at is not None:
-			when = at
-		elif after is not None:
-			assert after >= 0
-			when = now + after
-		else:
-			when = now
-		if isinstance(entity, self.Scheduled):
-			entity.when = when
-			entity.active = True
+			(when, deadline) = (at, at - offset)
 		else:
+			deadline = self.clock.monotonic()
+			if after is not None:
+				assert after >= 0
+				deadline += after
+			when = deadline + offset
+		if not isinstance(entity, self.Scheduled):
 			entity = self.Scheduled(when, entity)
+		return self._enqueue(entity, when, deadline, wall=at is not None)
+
+	def _enqueue(self, entity, when, deadline, wall=False):
+		""" Queue a Scheduled for when (wall-clock) at deadline (monotonic).
+			A wall entry's deadline is re-derived from when if the wall clock moves.
+		"""
+		if entity._entry:				# already pending; orphan that entry
+			entity._entry = None
+			entity._control._orphaned(entity)
+		entity.when = when
+		entity.active = True
 		if DEBUG: DEBUG("schedule", entity)
-		heapq.heappush(self._schedq, entity)
+		entity._control = self
+		entity._wall = wall
+		if wall:
+			self._schedwall += 1
+		entity._entry = entry = (deadline, next(self._schedseq), entity)
+		heapq.heappush(self._schedq, entry)
 		return entity
 
+	def _rederive(self):
+		""" The wall clock moved. Re-derive at= deadlines from the new offset (dropping orphans). """
+		if DEBUG: DEBUG("wall clock moved; re-deriving", self._schedwall, "timers")
+		offset = self._wall_offset
+		queue = []
+		for entry in self._schedq:
+			sched = entry[2]
+			if sched._entry is entry:
+				if sched._wall:
+					entry = sched._entry = (sched.when - offset, entry[1], sched)
+				queue.append(entry)
+		heapq.heapify(queue)
+		self._schedq[:] = queue
+		self._scheddead = 0
+
+	def _orphaned(self, entity):
+		""" A timer queue entry was cancelled. Compact the queue if it's getting mostly dead. """
+		if entity._wall:
+			self._schedwall -= 1
+		self._scheddead += 1
+		if self._scheddead > self.COMPACT_MIN and self._scheddead > len(self._schedq) * self.COMPACT_RATIO:
+			if DEBUG: DEBUG("timer queue compacting", self._scheddead, "of", len(self._schedq))
+			self._schedq[:] = [entry for entry in self._schedq if entry[2]._entry is entry]
+			heapq.heapify(self._schedq)
+			self._scheddead = 0
+
 	#
 	# Dispatch all due scheduled tasks.
-	# Cancelled events are still in the queue (but with active==False); discard those
+	# Cancelled events may still be in the queue (as orphaned entries); discard those
 	# as they pop to the front.
-	# Non-cancelled events are called out to their Scheduled with a context that is
-	# enriched with useful state fields. The context also holds a .reschedule() method
-	# that can be used to turn a one-shot timer into repeating form without drift.
+	# Non-cancelled events are called out to their Scheduled with a TimerContext.
+	# Its .reschedule() method can be used to turn a one-shot timer into repeating
+	# form without drift.
 	# Note that a *very* tight reschedule may slow the main event loop to a crawl
 	# though it won't entirely starve it.
 	#
 	def _dispatch(self):
 		backstop = self.TIMERLIMIT
-		while self.running and self._schedq:
+		schedq = self._schedq
+		clock = self.clock
+		stats = self.stats
+		while self.running and schedq:
 			backstop -= 1
 			if backstop < 0:
-				if DEBUG: DEBUG("timers backSTOP after", TIMERLIMIT, "consecutive issued")
+				if DEBUG: DEBUG("timers backSTOP after", self.TIMERLIMIT, "consecutive issued")
 				return
-			top = self._schedq[0]
-			if not top.active:		# has been cancelled
-				heapq.heappop(self._schedq)	# get rid of it
+			entry = schedq[0]
+			(deadline, _, top) = entry
+			if top._entry is not entry:	# has been cancelled or rescheduled
+				heapq.heappop(schedq)	# get rid of it
+				self._scheddead -= 1
 				if DEBUG: DEBUG("schedule drop", top)
 				continue
-			now = time.time()
-			if top.when > now:
+			now = clock.monotonic()
+			if deadline > now:
 				if DEBUG: DEBUG("queue top", top, "not ready at", now)
 				break
-			heapq.heappop(self._schedq)
-			class Ctx(asyn.Context):
-				def reschedule(self, at=None, after=None):
-					if at:
-						self.control.schedule(self.sched, at)
-					elif after:
-						self.control.schedule(self.sched, at=self.when + after)	# no-drift
-				def __repr__(self): return "<TIMER CTX:%r>" % self.sched
+			heapq.heappop(schedq)
+			top._entry = None
+			if top._wall:
+				self._schedwall -= 1
 			if DEBUG: DEBUG("schedule dispatch", top)
-			top.callout(Ctx('TIMER', sched=top, control=self, when=top.when, now=now))
+			if stats:
+				stats.lateness.add(now - deadline)
+			self._timed(top._callbacks[0] if top._callbacks else top,
+				top.callout, self.TimerContext(top, self, top.when, clock.time(), deadline))
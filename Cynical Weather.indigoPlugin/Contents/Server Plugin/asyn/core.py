@@ -97,6 +97,8 @@ class Callable(object):
 
 		Any callout may be handed an error context, and error callouts carry no arguments.
 		Make all callout arguments (beyond context) optional.
+
+		Subclasses that care when the callout set changes can override _callouts_changed.
 	"""
 	def __init__(self, callout=None):
 		""" Construct a Callable with an optional (single) callout pre-registered. """
@@ -106,11 +108,13 @@ class Callable(object):
 	def set_callout(self, callee):
 		""" Replace all callouts with a single new one. """
 		self._callbacks = [callee] if callee else []
+		self._callouts_changed()
 
 	def add_callout(self, callee):
 		""" Add a new callout to the existing set. """
 		if callee:
 			self._callbacks.append(callee)
+			self._callouts_changed()
 
 	def remove_callout(self, callee, required=True):
 		""" Remove a single callout from the current set (in which it must be). """
@@ -119,10 +123,17 @@ class Callable(object):
 		except ValueError:
 			if required:
 				raise
+		else:
+			self._callouts_changed()
 
 	def clear_callouts(self):
 		""" Unconditionally remove all callouts. """
 		self._callbacks = []
+		self._callouts_changed()
+
+	def _callouts_changed(self):
+		""" Hook: the callout set has changed. Does nothing here. """
+		pass
 
 	def has_callouts(self):
 		""" Test whether any callouts are currently registered. """
@@ -165,6 +165,11 @@ class Request(asyn.FilterCallable):
 
 		Requests broker their own network connections; they are not under
 		the control of the caller.
+
+		The reply body is normally collected and called out whole as 'body'
+		once the connection ends. Set stream_body to have each (decoded) chunk
+		called out as 'data' as it arrives instead; the final 'body' callout
+		then carries an empty body.
 	"""
 	_scan_headers = asyn.scan.Regex([
 		(r'HTTP/(1.[01]) (\d+) ([^\r]*)\r\n', 'status'), # status reply line
@@ -175,6 +180,7 @@ class Request(asyn.FilterCallable):
 	p_version = None
 	n_status = None
 	v_status = None
+	stream_body = False		# call out body data as it arrives (see incoming)
 
 	def __init__(self, control, url=None, callout=None, res=None,
 			action='GET', query=None, body=None, auth=None, compression=None):
@@ -291,7 +297,10 @@ class Request(asyn.FilterCallable):
 			self._prepare_body()
 			self.callout('headers', self.h_reply)
 		elif ctx.state == 'RAW' and self.scan is None:
-			self.body_reply += args[0]
+			if self.stream_body:	# pass it on; body_reply stays empty
+				self.callout('data', args[0])
+			else:
+				self.body_reply += args[0]
 		else:
 			super(Request, self).incoming(ctx, *args)
 
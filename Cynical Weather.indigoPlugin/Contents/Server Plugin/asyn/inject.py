@@ -22,6 +22,7 @@ import threading
 from collections import deque
 
 import asyn
+import asyn.pool
 from asyn import selectable
 
 
@@ -47,12 +48,29 @@ class Controller(asyn.Controller):
 		for avoiding thread contention on the data used. If queue_idle is True,
 		injections will be queued, but will not execute until the Controller is
 		resumed. The waiting versions of injection will wait until that happens.
+
+		Use submit() to run CPU-heavy work on a pool of worker threads (see asyn.pool)
+		and get its outcome called out back on the controller thread. The pool_size
+		construction argument bounds the number of those threads.
 	"""
-	def __init__(self, queue_idle=False, **kwargs):
+	POOL_SIZE = asyn.pool.POOL_SIZE		# default worker thread pool size
+
+	def __init__(self, queue_idle=False, pool_size=None, **kwargs):
 		asyn.Controller.__init__(self, **kwargs)
 		self._injector = _Inject(self)
 		self._run_thread = None
 		self._queue_idle = queue_idle
+		self.pool_size = pool_size or self.POOL_SIZE
+		self._pool = None					# ThreadPool (made on first use)
+		self._jobs = set()					# outstanding Jobs
+
+	def close(self):
+		for job in list(self._jobs):		# outstanding work is cancelled
+			job.cancel()
+		if self._pool:
+			self._pool.shutdown()
+			self._pool = None
+		asyn.Controller.close(self)
 
 	def run(self):
 		try:
@@ -86,6 +104,26 @@ class Controller(asyn.Controller):
 		self._injector.post(call, args, kwargs)
 
 
+	#
+	# Submit-and-call-back: run work on a pool thread and call out its outcome here.
+	#
+	def submit(self, fn, *args, callout=None, **kwargs):
+		""" Run fn(*args, **kwargs) on a worker thread; call out the outcome on ours.
+
+			Returns an asyn.pool.Job, which calls out a 'result' Context with the
+			return value, or an Error Context if fn raised. Cancel it with its cancel()
+			method. Fn runs concurrently with the controller thread, so it should
+			work only on what it's given.
+		"""
+		job = asyn.pool.Job(self, fn, args, kwargs, callout=callout)
+		self._jobs.add(job)
+		job.add_callout(lambda ctx, *args: self._jobs.discard(job))
+		if self._pool is None:
+			self._pool = asyn.pool.ThreadPool(self.pool_size)
+		self._pool.submit(job)
+		return job
+
+
 	#
 	# Inject-and-wait: inject, wait for completion, and return result (or raise).
 	#
@@ -196,13 +234,14 @@ class _Inject(asyn.Selectable):
 
 	def _can_read(self):
 		os.read(self._r, asyn.selectable.BUFSIZE)	# discard; it was just a wakeup call
+		control = self.control		# (an injected call may close us)
 		while True:		# atomically process queue elements
 			try:
 				sel, args, kwargs = self._q.popleft()
 			except IndexError:
 				return
 			try:
-				sel(*args, **kwargs)
+				control._timed(None, sel, *args, **kwargs)
 			except Exception:
 				pass
 
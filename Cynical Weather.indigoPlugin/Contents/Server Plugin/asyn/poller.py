@@ -0,0 +1,175 @@
+#
+# asyn.poller - I/O readiness polling backends for Controller
+#
+# Copyright 2023 Perry The Cynic. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#	http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# A Poller keeps the set of file descriptors a Controller is interested in,
+# and waits for some of them to become ready. The interest set is kept
+# persistently (in the kernel, where the OS allows), so a Controller only
+# tells its Poller about changes in interest, not the whole set every time.
+#
+# We have epoll (Linux), poll (most UNIX), and select (everywhere) flavors.
+# Controller picks the best one available unless told otherwise.
+#
+import select
+
+DEBUG = None
+
+
+class Poller(object):
+	""" Abstract base of I/O pollers.
+
+		Interest is set per file descriptor with set(fd, read, write).
+		Setting neither read nor write interest removes the descriptor; so does
+		forget(fd), which must be called before a registered descriptor is closed.
+		Poll(timeout) waits up to timeout seconds (None = forever) and returns
+		a pair of lists (readable fds, writable fds). Hangups and errors are reported
+		as readiness for whatever the descriptor is interested in, so the owner
+		discovers them by trying.
+	"""
+	name = None
+
+	def set(self, fd, read, write):
+		raise NotImplementedError
+
+	def forget(self, fd):
+		self.set(fd, False, False)
+
+	def poll(self, timeout):
+		raise NotImplementedError
+
+	def close(self):
+		pass
+
+
+class SelectPoller(Poller):
+	""" A Poller using select(2). Portable, but limited to FD_SETSIZE and O(n). """
+	name = 'select'
+
+	def __init__(self):
+		self._reads = set()
+		self._writes = set()
+
+	def set(self, fd, read, write):
+		(self._reads.add if read else self._reads.discard)(fd)
+		(self._writes.add if write else self._writes.discard)(fd)
+
+	def poll(self, timeout):
+		(reads, writes, _) = select.select(self._reads, self._writes, [], timeout)
+		return (reads, writes)
+
+
+class _MaskPoller(Poller):
+	""" Common logic for event-mask based pollers (poll and epoll). """
+	READ = WRITE = FAIL = 0		# event bits (set by subclasses)
+
+	def __init__(self):
+		self._masks = { }		# fd -> registered mask
+
+	def set(self, fd, read, write):
+		mask = (self.READ if read else 0) | (self.WRITE if write else 0)
+		old = self._masks.get(fd)
+		if mask == (old or 0):
+			return
+		if not mask:			# no interest: drop it (or we'd still hear of hangups)
+			del self._masks[fd]
+			self._unregister(fd)
+		elif old is None:
+			self._masks[fd] = mask
+			self._register(fd, mask)
+		else:
+			self._masks[fd] = mask
+			self._modify(fd, mask)
+
+	def _unregister(self, fd):
+		try:
+			self._impl.unregister(fd)
+		except (OSError, KeyError, ValueError):		# already closed; the kernel forgot it
+			pass
+
+	def poll(self, timeout):
+		reads = []
+		writes = []
+		for (fd, events) in self._poll(timeout):
+			mask = self._masks.get(fd, 0)
+			if events & self.FAIL:		# hangup/error: report as whatever it wants
+				events |= mask
+			if events & self.READ and mask & self.READ:
+				reads.append(fd)
+			if events & self.WRITE and mask & self.WRITE:
+				writes.append(fd)
+		return (reads, writes)
+
+
+class PollPoller(_MaskPoller):
+	""" A Poller using poll(2). No descriptor limit; still O(n) in the kernel. """
+	name = 'poll'
+	READ = select.POLLIN | select.POLLPRI if hasattr(select, 'poll') else 0
+	WRITE = select.POLLOUT if hasattr(select, 'poll') else 0
+	FAIL = select.POLLHUP | select.POLLERR | select.POLLNVAL if hasattr(select, 'poll') else 0
+
+	def __init__(self):
+		_MaskPoller.__init__(self)
+		self._impl = select.poll()
+
+	def _register(self, fd, mask):
+		self._impl.register(fd, mask)
+
+	def _modify(self, fd, mask):
+		self._impl.modify(fd, mask)
+
+	def _poll(self, timeout):
+		return self._impl.poll(None if timeout is None else timeout * 1000)
+
+
+class EpollPoller(_MaskPoller):
+	""" A Poller using Linux epoll(7). Interest lives in the kernel; wakeups are O(ready). """
+	name = 'epoll'
+	READ = select.EPOLLIN | select.EPOLLPRI if hasattr(select, 'epoll') else 0
+	WRITE = select.EPOLLOUT if hasattr(select, 'epoll') else 0
+	FAIL = select.EPOLLHUP | select.EPOLLERR if hasattr(select, 'epoll') else 0
+
+	def __init__(self):
+		_MaskPoller.__init__(self)
+		self._impl = select.epoll()
+
+	def _register(self, fd, mask):
+		self._impl.register(fd, mask)
+
+	def _modify(self, fd, mask):
+		self._impl.modify(fd, mask)
+
+	def _poll(self, timeout):
+		return self._impl.poll(-1 if timeout is None else timeout)
+
+	def close(self):
+		self._impl.close()
+
+
+POLLERS = [cls for (cls, needs) in
+	[(EpollPoller, 'epoll'), (PollPoller, 'poll'), (SelectPoller, 'select')]
+	if hasattr(select, needs)]		# available here, best first
+
+
+def poller_class(name=None):
+	""" Return the Poller class by name, or the default one if name is None.
+
+		The default is epoll where we have it (Linux), and select otherwise.
+		(Notably, macOS poll(2) does not work on terminals and devices.)
+	"""
+	for cls in POLLERS:
+		if cls.name == name or name is None and cls.name in ('epoll', 'select'):
+			return cls
+	raise ValueError(f"poller {name!r} is not available here")
@@ -0,0 +1,131 @@
+#
+# asyn.pool - running work on other threads
+#
+# Copyright 2023 Perry The Cynic. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#	http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# A ThreadPool runs Jobs - plain function calls - on a bounded set of worker
+# threads, and delivers their outcomes back on an asyn.inject.Controller's
+# thread as callouts. Use it (through Controller.submit) for CPU-heavy work
+# that would otherwise hold up I/O and timers: decoding large replies, building
+# tables, and such. The work must not touch Controller-owned state; hand it
+# what it needs and let the callout put the result in place.
+#
+# Pure Python work still contends for the GIL, of course; this buys
+# responsiveness, not parallelism. (Most C-level work - zlib, hashing, large
+# I/O - does release the GIL and runs truly in parallel.)
+#
+import threading
+import queue
+
+import asyn
+import asyn.stats
+
+DEBUG = None
+
+
+POOL_SIZE = 2				# default number of worker threads
+
+
+class Job(asyn.Callable):
+	""" A call submitted to a ThreadPool.
+
+		When done, the Job calls out a 'result' Context with the return value,
+		or an Error Context if the call raised. If cancel() is called first, it
+		calls out 'CANCELLED' instead, and the outcome of the call (if it had already
+		started) is discarded. All callouts happen on the Controller's thread.
+	"""
+	CANCELLED = asyn.Context('CANCELLED')
+
+	def __init__(self, control, fn, args, kwargs, callout=None):
+		asyn.Callable.__init__(self, callout=callout)
+		self.control = control
+		self._call = (fn, args, kwargs)
+		self.cancelled = False		# set (only) on the Controller thread
+		self.done = False
+
+	def cancel(self):
+		""" Cancel the Job. Call this on the Controller's thread. """
+		if not (self.done or self.cancelled):
+			self.cancelled = True
+			self._call = None
+			self.callout(self.CANCELLED)
+
+	def _run(self):
+		""" Perform the call (on a worker thread) and send the outcome home. """
+		call = self._call
+		if self.cancelled or call is None:	# (a stale look is fine; _deliver decides)
+			return
+		(fn, args, kwargs) = call
+		try:
+			outcome = (asyn.Context('result'), fn(*args, **kwargs))
+		except Exception as e:
+			outcome = (asyn.Error(e), None)
+		if not self.cancelled:				# (don't bother a closed Controller)
+			self.control.inject(self._deliver, *outcome)
+
+	def _deliver(self, ctx, result):
+		if not self.cancelled:
+			self.done = True
+			self._call = None
+			if ctx.error:
+				self.callout(ctx)
+			else:
+				self.callout(ctx, result)
+
+	def __repr__(self):
+		state = "cancelled" if self.cancelled else "done" if self.done else "pending"
+		return "<Job %s %s>" % (self._call and asyn.stats.callable_name(self._call[0]), state)
+
+
+class ThreadPool(object):
+	""" A bounded set of worker threads running Jobs in submission order.
+
+		Threads are started as work arrives, up to size of them, and stay around
+		until shutdown(). They are daemon threads, so they won't keep a process alive.
+	"""
+	def __init__(self, size=POOL_SIZE):
+		assert size > 0
+		self.size = size
+		self._queue = queue.SimpleQueue()
+		self._threads = []
+		self._lock = threading.Lock()
+		self._idle = 0				# workers waiting for work
+
+	def submit(self, job):
+		self._queue.put(job)
+		with self._lock:
+			if self._queue.qsize() > self._idle and len(self._threads) < self.size:
+				thread = threading.Thread(target=self._work, name="asyn pool %d" % len(self._threads), daemon=True)
+				self._threads.append(thread)
+				self._idle += 1			# (it will be, in a moment)
+				thread.start()
+
+	def shutdown(self):
+		""" Let the workers finish what's queued, and then quit. Does not wait for them. """
+		for thread in self._threads:
+			self._queue.put(None)
+		self._threads = []
+
+	def _work(self):
+		while True:
+			job = self._queue.get()
+			with self._lock:
+				self._idle -= 1
+			if job is None:
+				return
+			if DEBUG: DEBUG("pool runs", job)
+			job._run()
+			with self._lock:
+				self._idle += 1
@@ -0,0 +1,281 @@
+#
+# asyn.procpool - running work in pre-forked worker processes
+#
+# Copyright 2023 Perry The Cynic. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#	http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# A ProcessPool keeps a set of forked worker processes (ForkPipes) around and
+# hands them jobs, one at a time each. This gets GIL-bound Python work onto
+# other cores while the Controller stays responsive.
+#
+# Jobs and replies travel as length-prefixed frames (asyn.scan.LengthPrefix)
+# holding pickles: ('call', fn, args, kwargs) one way, ('result', value) or
+# ('error', exception) back. So fn, its arguments and its result must pickle;
+# fn in particular must be a module-level function (pickled by name). Since the
+# workers are forked, they have everything the parent had loaded at that time.
+#
+# The pool watches its workers. One that dies (or is killed for taking longer
+# than the pool's timeout) fails its job with a WorkerError and is replaced;
+# replacements are held off a little if workers keep dying right after starting.
+#
+# Fork early, before starting threads: a forked child only has the forking
+# thread, and any lock another thread held at that moment stays held forever.
+#
+import os
+import signal
+import pickle
+from collections import deque
+
+import asyn
+import asyn.pool
+import asyn.scan
+import asyn.selectable
+
+DEBUG = None
+
+
+RESTART_HOLDOFF = 5			# seconds to wait before replacing a worker that died young
+YOUNG = 1					# a worker dying this soon after starting died young
+READ_SIZE = 256 * 1024		# worker pipe read size (replies may be large)
+
+
+class WorkerError(Exception):
+	""" A worker process died (or was killed) while running a job. """
+	pass
+
+
+def _serve(sock):
+	""" The worker process: run calls from the parent until it hangs up.
+
+		We let go of every other file descriptor inherited from the parent first,
+		lest we keep its connections (including other workers' pipes) open.
+	"""
+	try:
+		fd = sock.fileno()
+		os.closerange(3, fd)
+		os.closerange(fd + 1, max(fd + 1, os.sysconf('SC_OPEN_MAX')))
+		_serve_calls(sock)
+	except BaseException:				# never return into the parent's code
+		return 1
+
+def _serve_calls(sock):
+	header = asyn.scan.LengthPrefix.HEADER
+	def receive(count):
+		data = bytearray(count)			# (filled in place, not grown)
+		view = memoryview(data)
+		got = 0
+		while got < count:
+			more = sock.recv_into(view[got:])
+			if not more:
+				return None
+			got += more
+		return data
+	while True:
+		head = receive(header.size)
+		if head is None:
+			return						# parent hung up; we're done
+		request = receive(header.unpack(head)[0])
+		if request is None:
+			return
+		try:
+			(_, fn, args, kwargs) = pickle.loads(request)
+			reply = ('result', fn(*args, **kwargs))
+			payload = pickle.dumps(reply, pickle.HIGHEST_PROTOCOL)
+		except Exception as e:
+			try:
+				payload = pickle.dumps(('error', e), pickle.HIGHEST_PROTOCOL)
+			except Exception:			# unpicklable exception
+				payload = pickle.dumps(('error', WorkerError(repr(e))), pickle.HIGHEST_PROTOCOL)
+		sock.sendall(asyn.scan.LengthPrefix.frame(payload))
+
+
+class Worker(object):
+	""" A worker process as seen from the parent (pool) side. """
+	def __init__(self, pool):
+		self.pool = pool
+		self.job = None				# Job in progress
+		self.jobs = 0				# jobs completed
+		self.started = pool.control.time()
+		self._timer = None			# job timeout
+		self._killed = None			# why we killed it (if we did)
+		self.pipe = asyn.selectable.ForkPipe(pool.control, _serve, callout=self._incoming)
+		self.pipe.scan = asyn.scan.LengthPrefix()
+		self.pipe.read_size = READ_SIZE
+		self.pid = self.pipe.pid
+		if DEBUG: DEBUG("worker", self.pid, "started")
+
+	@property
+	def state(self):
+		return 'busy' if self.job else 'idle' if self.pipe.control else 'dead'
+
+	def run(self, job):
+		""" Send a job to the worker. """
+		try:
+			payload = pickle.dumps(('call',) + job._call, pickle.HIGHEST_PROTOCOL)
+		except Exception as e:
+			job._deliver(asyn.Error(e), None)
+			return self.pool._ready(self)
+		self.job = job
+		self.pipe.write(asyn.scan.LengthPrefix.frame(payload))
+		if self.pool.timeout is not None:
+			self._timer = self.pool.control.schedule(self._expired, after=self.pool.timeout)
+
+	def kill(self, reason):
+		""" Kill the worker process. It will be reaped and replaced as usual. """
+		if self._killed is None:
+			self._killed = reason
+			try:
+				os.kill(self.pid, signal.SIGKILL)
+			except OSError:
+				pass
+
+	def _expired(self, ctx):
+		self._timer = None
+		if DEBUG: DEBUG("worker", self.pid, "timed out on", self.job)
+		self.kill(WorkerError("job took longer than %g seconds" % self.pool.timeout))
+
+	def _incoming(self, ctx, data=None):
+		if ctx.state == 'frame':
+			job = self._finish()
+			if job is None:				# (can't happen)
+				return self.pipe.close()
+			try:
+				(tag, value) = pickle.loads(data)
+			except Exception as e:		# (result class unknown here, perhaps)
+				(tag, value) = ('error', e)
+			self.jobs += 1
+			if tag == 'result':
+				job._deliver(asyn.Context('result'), value)
+			else:
+				job._deliver(asyn.Error(value), None)
+			self.pool._ready(self)
+		elif ctx.state == 'CLOSE':
+			job = self._finish()
+			if job:
+				job._deliver(asyn.Error(self._killed or WorkerError("worker process died")), None)
+			self.pool._died(self)
+		elif ctx.error:
+			if DEBUG: DEBUG("worker", self.pid, "error", ctx)
+			self.pipe.close()
+
+	def _finish(self):
+		job = self.job
+		self.job = None
+		if self._timer:
+			self._timer.cancel()
+			self._timer = None
+		return job
+
+	def reap(self):
+		""" Collect the exit status of our (dead) process. Returns False if it's still around. """
+		try:
+			(pid, status) = os.waitpid(self.pid, os.WNOHANG)
+		except ChildProcessError:
+			return True					# someone else reaped it
+		return pid != 0
+
+	def __repr__(self):
+		return "<Worker %d %s jobs:%d>" % (self.pid, self.state, self.jobs)
+
+
+class ProcessPool(object):
+	""" A pool of forked worker processes running Jobs.
+
+		Size is the number of workers (default: one per CPU). Workers are forked
+		right away and kept running. If timeout is given, a job running longer
+		than that many seconds gets its worker killed and fails with a WorkerError.
+		Submit returns an asyn.pool.Job, with the same callouts as thread pool Jobs.
+		Health() reports on the workers; restarts counts the replacements.
+	"""
+	def __init__(self, control, size=None, timeout=None):
+		self.control = control
+		self.size = size or os.cpu_count() or 1
+		self.timeout = timeout
+		self.restarts = 0			# workers replaced
+		self._queue = deque()		# Jobs waiting for a worker
+		self._idle = []				# Workers waiting for a Job
+		self._reaping = []			# dead Workers not yet reaped
+		self._reap_timer = None
+		self._closed = False
+		self.workers = [self._start() for n in range(self.size)]
+
+	def submit(self, fn, *args, callout=None, **kwargs):
+		""" Run fn(*args, **kwargs) in a worker process; call out the outcome here. """
+		assert not self._closed
+		job = asyn.pool.Job(self.control, fn, args, kwargs, callout=callout)
+		self._queue.append(job)
+		self._dispatch()
+		return job
+
+	def close(self):
+		""" Cancel all queued jobs and shut down the workers. """
+		self._closed = True
+		while self._queue:
+			self._queue.popleft().cancel()
+		for worker in list(self.workers):
+			if worker.job:
+				worker.job.cancel()
+			worker.pipe.close()			# worker sees EOF and exits
+		self.workers = []
+		self._idle = []
+
+	def health(self):
+		""" A list of dicts describing each worker. """
+		now = self.control.time()
+		return [dict(pid=worker.pid, state=worker.state, jobs=worker.jobs, age=now - worker.started)
+			for worker in self.workers]
+
+	def _start(self):
+		worker = Worker(self)
+		self._idle.append(worker)
+		return worker
+
+	def _dispatch(self):
+		while self._queue and self._idle:
+			job = self._queue.popleft()
+			if not job.cancelled:
+				self._idle.pop().run(job)
+
+	def _ready(self, worker):
+		self._idle.append(worker)
+		self._dispatch()
+
+	def _died(self, worker):
+		if DEBUG: DEBUG("worker", worker.pid, "died")
+		if worker in self._idle:
+			self._idle.remove(worker)
+		self._reap(worker)
+		if self._closed or worker not in self.workers:
+			return
+		self.workers.remove(worker)
+		def restart(ctx=None):
+			if not self._closed:
+				self.restarts += 1
+				self.workers.append(self._start())
+				self._dispatch()
+		if self.control.time() - worker.started < YOUNG:
+			self.control.schedule(restart, after=RESTART_HOLDOFF)
+		else:
+			restart()
+
+	def _reap(self, worker=None):
+		""" Reap dead workers' processes, trying again later for any that linger. """
+		if worker:
+			self._reaping.append(worker)
+		self._reaping = [worker for worker in self._reaping if not worker.reap()]
+		if self._reaping and not self._reap_timer:
+			def again(ctx):
+				self._reap_timer = None
+				self._reap()
+			self._reap_timer = self.control.schedule(again, after=1)
@@ -28,6 +28,7 @@
 DEBUG = None
 
 import re
+import struct
 
 from asyn.core import Context
 
@@ -168,6 +169,61 @@ class TokenScan(object):
 		return len(records)			# will be 0 ~ false if no full records found
 			
 
+#
+# A Scanner for length-prefixed binary frames.
+#
+class LengthPrefix(object):
+	""" A Scanner that separates frames, each preceded by its length.
+
+		The length is a 4-byte big-endian unsigned integer. Complete frames are
+		called out (without their length) with the given state. Use frame() to
+		make them on the sending side.
+
+		A frame that arrives in many pieces is collected here (and joined once
+		it's complete) rather than in the target's read buffer, which would be
+		copied again with every piece. So a LengthPrefix serves one target, and
+		that target's flush_scan() doesn't see a partial frame.
+	"""
+	HEADER = struct.Struct('>I')
+
+	def __init__(self, state='frame'):
+		self.state = state
+		self._chunks = []			# pieces of an incomplete frame (with its header)
+		self._have = 0				# bytes in _chunks
+		self._end = 0				# bytes needed for the frame (with its header)
+
+	@classmethod
+	def frame(cls, payload):
+		""" Make a frame (bytes to send) from a payload (bytes). """
+		return cls.HEADER.pack(len(payload)) + payload
+
+	def scan(self, target):
+		""" Call out one full frame, if we have one. """
+		rbuf = target._rbuf
+		size = self.HEADER.size
+		if self._chunks:				# adding to a partial frame
+			self._chunks.append(rbuf)
+			self._have += len(rbuf)
+			target._rbuf = b''
+			if self._have < self._end:
+				return False
+			rbuf = b''.join(self._chunks)
+			self._chunks = []
+		if len(rbuf) < size:
+			target._rbuf = rbuf
+			return False
+		end = size + self.HEADER.unpack_from(rbuf)[0]
+		if len(rbuf) < end:				# wait for the rest
+			self._chunks = [rbuf]
+			(self._have, self._end) = (len(rbuf), end)
+			target._rbuf = b''
+			return False
+		if DEBUG: DEBUG("frame of", end - size)
+		target._rbuf = rbuf[end:]
+		target.callout(self.state, rbuf[size:end])
+		return True
+
+
 #
 # A Scanner that passes input subject to byte count constraints.
 #
@@ -47,6 +47,11 @@ class Selectable(Callable):
 		The subclass must provide a fileno() method that returns it.
 
 		Selectable itself has no read or write behavior. Subclasses define this.
+		Their _wants_read and _wants_write methods say whether they are currently
+		interested in reading or writing. The Controller only asks again after
+		they called _interest_changed(), after their callouts changed, and after
+		each of their _can_read or _can_write calls; so a subclass whose answer
+		changes at any other time must call _interest_changed() when it does.
 
 		Subclasses of Selectable use their Callable personality to deliver input.
 
@@ -59,6 +64,7 @@ class Selectable(Callable):
 		of course.
 	"""
 	is_plumbing = False			# do not hide in external lists and views
+	control = None				# our Controller (while active)
 
 	def __init__(self, control, callout=None):
 		""" Construct a Selectable for a given Control. """
@@ -94,6 +100,14 @@ class Selectable(Callable):
 		""" Tell control that we want to write. """
 		return False
 
+	def _interest_changed(self):
+		""" Tell control that _wants_read or _wants_write may answer differently now. """
+		if self.control:
+			self.control.reconsider(self)
+
+	def _callouts_changed(self):
+		self._interest_changed()		# (many _wants_read depend on has_callouts)
+
 	def _null_read(self):
 		""" Default action for null reads is to close. May be overridden. """
 		self.callout(END)
@@ -213,7 +227,11 @@ class Stream(IO, scan.Scannable):
 		There are currently no notifications of writability or queue-empty events,
 		but you can call .shutdown() and the Stream will close after all pending
 		data has been sent.
+
+		Input is read read_size bytes at a time; raise it for bulk transfers.
 	"""
+	read_size = BUFSIZE
+
 	def __init__(self, control, io, callout=None):
 		IO.__init__(self, control, io, callout=callout)
 		scan.Scannable.__init__(self)
@@ -234,7 +252,7 @@ class Stream(IO, scan.Scannable):
 	def _can_read(self):
 		""" Notification that we may try to read from our file descriptor. """
 		try:
-			input = os.read(self.fileno(), BUFSIZE)
+			input = os.read(self.fileno(), self.read_size)
 		except OSError as e:
 			self.callout_error(e)
 			return
@@ -266,6 +284,7 @@ class Stream(IO, scan.Scannable):
 	def write(self, whatever):
 		""" Add some bytes to the write queue and push them out. """
 		self._wbuf += whatever
+		self._interest_changed()
 		self._can_write()
 
 	def write_a(self, whatever):
@@ -322,6 +341,7 @@ class Datagram(IO, scan.Scannable):
 
 	def write(self, data, addr, flags=0):
 		self._wqueue.append((data, addr, flags))
+		self._interest_changed()
 
 
 #
@@ -0,0 +1,117 @@
+#
+# asyn.stats - event loop instrumentation
+#
+# Copyright 2023 Perry The Cynic. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#	http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# A Controller keeps a Stats object (unless told not to) recording:
+#  * how many loop iterations it ran, and the time spent waiting vs. busy;
+#  * how late timers fire (actual time minus the time they were due);
+#  * how long each kind of callout takes, keyed by a printable name
+#    for the callable (module.qualname, or Class.read/write for I/O).
+# All timings are histograms with power-of-two buckets, which cost a few
+# arithmetic operations to update and stay the same size forever.
+#
+import time
+
+DEBUG = None
+
+
+BUCKETS = 32				# 1us, 2us, 4us, ... 2^31us (about 36 minutes) and up
+
+
+class Histogram(object):
+	""" Counts of durations (seconds) in power-of-two microsecond buckets. """
+	__slots__ = ('count', 'total', 'max', 'buckets')
+
+	def __init__(self):
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+		self.buckets = [0] * BUCKETS
+
+	def add(self, seconds):
+		self.count += 1
+		self.total += seconds
+		if seconds > self.max:
+			self.max = seconds
+		bucket = int(seconds * 1e6).bit_length() if seconds > 0 else 0
+		self.buckets[bucket if bucket < BUCKETS else BUCKETS - 1] += 1
+
+	def percentile(self, fraction):
+		""" Upper bound (seconds) of the bucket holding the given fraction of samples. """
+		wanted = fraction * self.count
+		seen = 0
+		for (bucket, n) in enumerate(self.buckets):
+			seen += n
+			if n and seen >= wanted:
+				return min((1 << bucket) / 1e6, self.max)
+		return self.max
+
+	def snapshot(self):
+		""" A plain dict summary. Buckets maps upper bounds (seconds) to counts. """
+		return dict(
+			count=self.count,
+			total=self.total,
+			mean=self.total / self.count if self.count else 0.0,
+			max=self.max,
+			p50=self.percentile(0.5),
+			p99=self.percentile(0.99),
+			buckets={ (1 << bucket) / 1e6: n for (bucket, n) in enumerate(self.buckets) if n },
+		)
+
+	def __repr__(self):
+		return "<Histogram %d mean %.6f max %.6f>" % (self.count, self.total / (self.count or 1), self.max)
+
+
+class Stats(object):
+	""" Event loop counters of a Controller. """
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		self.started = time.time()
+		self.iterations = 0				# trips around the loop
+		self.wait = 0.0					# seconds spent waiting for I/O or timers
+		self.busy = 0.0					# seconds spent doing anything else
+		self.lateness = Histogram()		# timer lateness
+		self.callouts = { }				# name -> Histogram of callout durations
+
+	def record(self, name, seconds):
+		histogram = self.callouts.get(name)
+		if histogram is None:
+			histogram = self.callouts[name] = Histogram()
+		histogram.add(seconds)
+
+	def snapshot(self):
+		""" Everything as plain dicts and numbers. """
+		return dict(
+			since=self.started,
+			iterations=self.iterations,
+			wait=self.wait,
+			busy=self.busy,
+			lateness=self.lateness.snapshot(),
+			callouts={ name: h.snapshot() for (name, h) in self.callouts.items() },
+		)
+
+	def slowest(self, count=10):
+		""" The (name, Histogram) pairs with the most total callout time, worst first. """
+		return sorted(self.callouts.items(), key=lambda item: item[1].total, reverse=True)[:count]
+
+
+def callable_name(fn):
+	""" A printable name for a callable, for keying statistics. """
+	name = getattr(fn, '__qualname__', None) or type(fn).__qualname__
+	module = getattr(fn, '__module__', None)
+	return f"{module}.{name}" if module else name
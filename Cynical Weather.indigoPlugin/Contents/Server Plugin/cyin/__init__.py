@@ -40,6 +40,7 @@ from cyin.configui import ConfigUI					# classes
 from cyin.filter import MenuFilter, MenuGenerator	# classes
 from cyin.attr import PluginProperty, DeviceState, PluginPreference # descriptors
 from cyin.attr import Variable, NamedVariable, cached, Cached
+from cyin.attr import state_batch					# context managers
 from cyin.confedit import FieldEditor				# classes
 
 #
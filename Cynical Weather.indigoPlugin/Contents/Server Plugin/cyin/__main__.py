@@ -0,0 +1,164 @@
+from __future__ import print_function
+#
+# Regression test for cyin device state handling
+#
+# This needs Indigo's Python (for the indigo module), but no server:
+# a stand-in plays the Indigo device object and records what we ask of it.
+#
+import cyin
+from cyin.attr import DeviceState
+from cyin.iom import DeviceFeatures
+
+
+print('cyin device state regression starting...')
+
+
+class TestDevice(object):
+	""" Stand-in for an indigo.Device. Calls are recorded; server holds the server's states. """
+	def __init__(self, states):
+		self.id = 1
+		self.pluginId = "test.plugin"
+		self.server = dict(states)
+		self.states = dict(states)
+		self.calls = []
+
+	def refreshFromServer(self):
+		self.calls.append("refresh")
+		self.states = dict(self.server)
+
+	def updateStateOnServer(self, key, value, uiValue=None):
+		self.calls.append(("update", key))
+		self.server[key] = value
+
+	def updateStatesOnServer(self, updates):
+		self.calls.append(("updates", sorted(update["key"] for update in updates)))
+		for update in updates:
+			self.server[update["key"]] = update["value"]
+
+
+class TestPlugin(object):
+	""" Stand-in for the cyin Plugin object. """
+	ident = "test.plugin"
+	_observed_kinds = set()
+	now = 1696143600.0
+
+	def time(self):
+		return self.now
+
+	def supports(self, feature):
+		return feature == "uivalue"
+
+
+class Probe(DeviceFeatures):
+	deleted = False
+
+	temp = DeviceState(name="temp", type=float, format=" F")
+	humidity = DeviceState(name="humidity", type=float)
+	icon = DeviceState(name="icon", type=str)
+
+	def __init__(self, io):
+		self.io = io
+
+	def refresh(self):
+		self.io.refreshFromServer()
+
+cyin.plugin = TestPlugin()
+
+def probe():
+	return Probe(TestDevice(dict(temp=50.0, humidity=40.0, icon="rain")))
+
+
+#
+# Batched writes
+#
+print('(state_batch)')
+dev = probe()
+with dev.batched_states():
+	dev.temp = 60.5
+	dev.humidity = 30
+	with dev.batched_states():
+		dev.icon = "clear-day"
+		dev.temp = 61
+	assert dev.io.calls == [] and dev.temp == 61		# held back, but visible to us
+assert dev.io.calls == [("updates", ["humidity", "icon", "temp"])], dev.io.calls
+assert dev.io.server == dict(temp=61.0, humidity=30.0, icon="clear-day")
+dev = probe()
+dev.temp = 70											# outside a batch: one call per write
+dev.icon = "fog"
+assert dev.io.calls == [("update", "temp"), ("update", "icon")], dev.io.calls
+dev = probe()
+with dev.batched_states():
+	pass
+assert dev.io.calls == []								# nothing written, nothing sent
+
+
+#
+# Shadow states
+#
+print('(shadow states)')
+dev = probe()
+assert (dev.temp, dev.humidity, dev.icon) == (50.0, 40.0, "rain")
+assert dev.temp == 50.0 and dev.io.calls == ["refresh"]		# one fetch serves all reads
+dev.io.server["temp"] = 99									# changed behind our back; not told yet
+assert dev.temp == 50.0 and dev.io.calls == ["refresh"]
+dev.humidity = 35											# our own writes go through the copy
+assert dev.humidity == 35 and dev.io.calls == ["refresh", ("update", "humidity")]
+news = TestDevice(dict(dev.io.server, icon="snow"))			# Indigo tells us (deviceUpdated)
+dev._update_states(news)
+assert (dev.temp, dev.icon) == (99, "snow") and dev.io.calls == ["refresh", ("update", "humidity")]
+dev.invalidate_states()										# flush; next read goes to the server
+dev.io.server["icon"] = "hail"
+assert dev.icon == "hail" and dev.io.calls.count("refresh") == 2
+assert dev.temp == 99 and dev.io.calls.count("refresh") == 2
+
+dev = probe()
+dev.io.pluginId = "someone.else"							# foreign device we don't observe
+assert dev.temp == 50.0 and dev.temp == 50.0 and dev.io.calls == ["refresh", "refresh"]
+cyin.plugin._observed_kinds.add("device")					# now we hear of its changes
+assert dev.temp == 50.0 and dev.io.calls == ["refresh", "refresh"]
+cyin.plugin._observed_kinds.discard("device")
+
+
+#
+# Deadbands and staleness
+#
+print('(deadbands)')
+class Banded(Probe):
+	temp = DeviceState(name="temp", type=float, deadband=0.5, stale=600)
+	humidity = DeviceState(name="humidity", type=float, relative=0.1)
+	icon = DeviceState(name="icon", type=str, deadband=0)
+
+dev = Banded(TestDevice(dict(temp=50.0, humidity=40.0, icon="rain")))
+def writes():
+	return [call for call in dev.io.calls if call != "refresh"]
+dev.temp = 50.0									# first write is always published
+dev.humidity = 40
+dev.icon = "rain"
+assert writes() == [("update", "temp"), ("update", "humidity"), ("update", "icon")]
+dev.io.calls = []
+dev.temp = 50.3									# within 0.5
+dev.temp = 49.6
+dev.humidity = 43.9								# within 10% of 40
+dev.icon = "rain"								# unchanged
+assert writes() == []
+assert dev.io.server["temp"] == 50.0			# (the band is around the published value)
+dev.temp = 50.6									# outside
+dev.humidity = 44.5
+dev.icon = "snow"
+assert writes() == [("update", "temp"), ("update", "humidity"), ("update", "icon")]
+assert dev.io.server == dict(temp=50.6, humidity=44.5, icon="snow")
+dev.io.calls = []
+dev.temp = 50.7
+assert writes() == []
+cyin.plugin.now += 600							# ten minutes later: stale, so written anyway
+dev.temp = 50.7
+assert writes() == [("update", "temp")]
+dev.io.calls = []
+with dev.batched_states():						# the band applies to pending batch values, too
+	dev.temp = 52
+	dev.temp = 52.2
+	dev.icon = "snow"
+assert writes() == [("updates", ["temp"])] and dev.io.server["temp"] == 52
+
+
+print('cyin device state regression passed')
@@ -51,6 +51,13 @@ class Plugin(cyin.Plugin, asyn.inject.Controller):
 	def __init__(self, pluginId, pluginDisplayName, pluginVersion, pluginPrefs):
 		cyin.Plugin.__init__(self, pluginId, pluginDisplayName, pluginVersion, pluginPrefs)
 		asyn.inject.Controller.__init__(self)
+		self.slow.add_callout(self._slow_callout)
+
+	time = asyn.inject.Controller.time		# (the Controller's clock, not cyin.Plugin's)
+
+	def _slow_callout(self, ctx):
+		""" Mention callouts that held up the plugin thread for too long. """
+		debug("slow callout: %s took %.3f seconds" % (ctx.name, ctx.duration))
 
 
 	#
@@ -22,6 +22,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+from contextlib import contextmanager
+
 import indigo
 import cyin
 import cyin.eval
@@ -295,30 +297,104 @@ def Cached(name, func):
 # Note that Indigo restricts values assigned to device properties.
 #
 class DeviceState(_DescField):
-	""" A descriptor to hook into a device's state dictionary. """
+	""" A descriptor to hook into a device's state dictionary.
+
+		Deadband and relative declare a band around the last published value
+		within which new values are not worth writing to Indigo: deadband is
+		absolute, relative a fraction of the old value, and the wider applies.
+		An unchanged value always falls within the band, so deadband=0 makes
+		a state change-only. Stale (seconds) forces a write anyway once the
+		last one is that old. None of this applies to states with a setter.
+	"""
 	_desc_type = "state"
 
-	def __init__(self, type=str, untype=None, setter=None, **kwargs):
+	def __init__(self, type=str, untype=None, setter=None, deadband=None, relative=None, stale=None, **kwargs):
 		super(DeviceState, self).__init__(type=type, untype=untype or type, **kwargs)
 		self.setter = setter
+		self.deadband = deadband
+		self.relative = relative
+		self.stale = stale
 
 	def __get__(self, obj, type):
-		obj.refresh()
-		return self.type(obj.io.states[self.name])
+		batch = obj._state_batch
+		if batch and self.name in batch:	# pending batched write
+			return self.type(batch[self.name]["value"])
+		return self.type(obj.state_value(self.name))
 
 	def __set__(self, obj, value):
 		if not obj.deleted:
 			value = self.untype(value)
 			if self.setter:		# custom
+				obj.invalidate_states()		# no telling what it does
 				return self.setter(obj, value)
+			if self._in_band(obj, value):
+				return						# not worth a write
+			update = dict(key=self.name, value=value)
 			if self.format is not None and cyin.plugin.supports("uivalue"):
 				if isinstance(self.format, str):
-					uiValue = str(value) + self.format	# simple suffix
+					update["uiValue"] = str(value) + self.format	# simple suffix
 				else:
-					uiValue = self.format(value, obj) # computation
-				obj.io.updateStateOnServer(self.name, value, uiValue=uiValue)
+					update["uiValue"] = self.format(value, obj) # computation
+			if obj._state_batch is not None:	# collect for later
+				obj._state_batch[self.name] = update
 			else:
-				obj.io.updateStateOnServer(self.name, value)
+				if "uiValue" in update:
+					obj.io.updateStateOnServer(self.name, value, uiValue=update["uiValue"])
+				else:
+					obj.io.updateStateOnServer(self.name, value)
+				obj._store_states([update])
+			if self.deadband is not None or self.relative is not None:
+				obj._state_written[self.name] = cyin.plugin.time()
+
+	def _in_band(self, obj, value):
+		""" Is value close enough to the published one to skip writing it? """
+		if self.deadband is None and self.relative is None:
+			return False
+		if obj._state_written is None:
+			obj._state_written = { }
+		written = obj._state_written.get(self.name)
+		if written is None:
+			return False			# never written by us; publish
+		if self.stale is not None and cyin.plugin.time() - written >= self.stale:
+			return False			# overdue
+		batch = obj._state_batch
+		old = batch[self.name]["value"] if batch and self.name in batch else obj.state_value(self.name)
+		if value == old:
+			return True
+		try:
+			old = float(old)
+			delta = abs(float(value) - old)
+		except (TypeError, ValueError):
+			return False			# non-numeric and different
+		band = max(self.deadband or 0, (self.relative or 0) * abs(old))
+		return delta == 0 or delta < band
+
+
+#
+# Batching of DeviceState writes.
+#
+@contextmanager
+def state_batch(obj):
+	""" Collect DeviceState writes to obj and send them to Indigo in one call.
+
+		Within the context, assignments to obj's DeviceStates are held back
+		(later writes to the same state replacing earlier ones) and are all
+		sent with a single updateStatesOnServer call when the outermost context
+		exits. Reads of a state with a pending write return the pending value.
+		Batches nest; inner ones merge into the outermost.
+	"""
+	if obj._state_batch is not None:	# nested; outer batch will flush
+		yield
+		return
+	obj._state_batch = { }
+	try:
+		yield
+	finally:
+		batch = obj._state_batch
+		obj._state_batch = None
+		if batch and not obj.deleted:
+			obj.io.updateStatesOnServer(list(batch.values()))
+			obj._store_states(batch.values())
 
 
 #
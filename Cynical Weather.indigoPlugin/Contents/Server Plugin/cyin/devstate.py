@@ -73,6 +73,10 @@ class Device(cyin.Device, asyn.Callable, register=False):
 		tracked and echoed into our state. If the host device resets, so do we
 		(even from a hard failure).
 
+		Each Device keeps track of the Devices that currently use it as their
+		host device (its dependents), so work that concerns only those can skip
+		scanning all devices of a kind.
+
 		Device is an asyn.Callable. It will callout when it changes state.
 		This is how host device state tracking works, and you can hook state
 		changes for any other purpose by adding your own callback.
@@ -88,6 +92,7 @@ class Device(cyin.Device, asyn.Callable, register=False):
 		asyn.Callable.__init__(self)
 		self.mstate = OPERATING			# microstate
 		self.hostdev = None				# no host device
+		self.dependents = { }			# id -> Device using us as host device
 
 	def start(self):
 		super(Device, self).start()
@@ -98,6 +103,8 @@ class Device(cyin.Device, asyn.Callable, register=False):
 		self.mstate = STOPPED			# make unready
 		self._cancel_retry()
 		self.callout('change', self)	# tell any dependents
+		if self.deleted:				# going away for good; let go of our host
+			self.set_hostdev(None)
 		super(Device, self).stop()
 
 	def set_hostdev(self, dev):
@@ -106,14 +113,22 @@ class Device(cyin.Device, asyn.Callable, register=False):
 		if dev != self.hostdev:
 			if self.hostdev:
 				self.hostdev.remove_callout(self._base_change)
+				self.hostdev.dependents.pop(self.id, None)
 			self.hostdev = dev
 			if dev:
 				dev.add_callout(self._base_change)
+				dev.dependents[self.id] = self
 				if dev.state == "unavailable":
 					self.fail_hard("host device %s is unavailable" % dev.name)
 				return dev.ready()
 		return True
 
+	def all_dependents(self, cls=None):
+		""" Iterate over our active dependents (of a given class, if specified). """
+		for dev in list(self.dependents.values()):	# snapshot - it may change
+			if dev.active and (cls is None or isinstance(dev, cls)):
+				yield dev
+
 	def ready(self):
 		""" Have we made it out of "preparing" without failing? """
 		return cyin.Device.ready(self) and self.mstate == OPERATING and self.state != "preparing"
@@ -25,7 +25,7 @@ import indigo
 import cyin
 from cyin.core import debug, error, log
 from cyin.core import i_equal
-from cyin.attr import PluginProperty, DeviceState, is_descriptor
+from cyin.attr import PluginProperty, DeviceState, is_descriptor, state_batch
 from cyin.configui import ConfigUI
 
 import datetime
@@ -40,10 +40,26 @@ DEBUG = None
 _iomap = { }				# indigo object id -> IOM object
 _clsmap = { }				# indigo type string -> IOM class object
 _pluginmap = { }			# indigo plugin id -> PluginCore object
+_classidx = { }				# IOM class -> { id -> IOM object } of it and its subclasses
 
 _self = object()			# under-construction marker in _iomap
 
 
+def _map_object(iom):
+	""" Record a (newly made) IOM object in _iomap and the class index. """
+	_iomap[iom.id] = iom
+	for cls in type(iom).__mro__:
+		if issubclass(cls, IOMBase):
+			_classidx.setdefault(cls, { })[iom.id] = iom
+
+def _unmap_object(id):
+	""" Remove an IOM object from _iomap and the class index. """
+	iom = _iomap.pop(id)
+	if iom is not _self:
+		for cls in type(iom).__mro__:
+			_classidx.get(cls, { }).pop(id, None)
+
+
 def type_for(type, report_error=True):
 	""" Get the class object for an XML type name. Returns None (and yells) if not found. """
 	ltype = type.lower()
@@ -116,7 +132,7 @@ def device(id, ui=None):
 		finally:
 			if _iomap[id] == _self:			# construction failed
 				error("Error constructing %s device %s[%d]" % (iodev.deviceTypeId, iodev.name, id))
-				del _iomap[id]				# clear marker; allow retry
+				_unmap_object(id)			# clear marker; allow retry
 				return None
 	return _iomap[id]
 
@@ -179,6 +195,8 @@ def start_object(io, type, ui=None):
 	if _enabled(io) and not iom.active:
 		debug(iom.name, "starting")
 		iom.io = io
+		if isinstance(iom, DeviceFeatures):
+			iom.invalidate_states()		# start from server truth
 		iom.active = True
 		iom.start()
 
@@ -199,7 +217,13 @@ def stop_object(io, change=False, destroy=False):
 			iom.stop()
 		if destroy:
 			debug(iom.name, "destroyed")
-			del _iomap[id]
+			_unmap_object(id)
+
+def update_states(new):
+	""" Feed a device's new states into its shadow copy, if we have one. """
+	iom = _iomap.get(new.id)
+	if isinstance(iom, DeviceFeatures):
+		iom._update_states(new)
 
 def update_object(old, new, typeid):
 	""" Unconditional update funnel. Called whenever Indigo signals a config change. """
@@ -381,8 +405,8 @@ class IOMBase(object):
 			During startup, this iteration may be incomplete; it only shows
 			objects already registered with cyin.
 		"""
-		for iom in list(_iomap.values()):		# snapshot _iomap - it may change
-			if isinstance(iom, cls) and iom.active:
+		for iom in list(_classidx.get(cls, { }).values()):	# snapshot - it may change
+			if iom.active:
 				if filter(iom):
 					yield iom
 
@@ -428,7 +452,7 @@ class IOM(IOMBase, Observer):
 		IOMBase.__init__(self, io)
 		Observer.__init__(self)
 		self.id = io.id
-		_iomap[self.id] = self
+		_map_object(self)
 		self.name = io.name
 		self.active = False
 		if self.local:
@@ -557,6 +581,46 @@ class IOM(IOMBase, Observer):
 class DeviceFeatures(object):
 	
 	_prior = None		# temporary store for old value during update notices
+	_state_batch = None	# pending DeviceState writes (see batched_states)
+	_states = None		# shadow copy of io.states (None if not current)
+	_state_written = None	# name -> time of last deadbanded state write
+
+	def batched_states(self):
+		""" Context manager: send all state writes made within as one update. """
+		return state_batch(self)
+
+	#
+	# Shadow copy of device states.
+	# DeviceState reads are served from a local copy of the device's states,
+	# which is written through by our own updates and replaced whenever Indigo
+	# tells us the device changed. We only trust it if we actually get told
+	# (our own devices, or anyone's if we observe device changes); otherwise
+	# every read goes to the server as before.
+	#
+	@property
+	def _shadowed(self):
+		return self.io.pluginId == cyin.plugin.ident or "device" in cyin.plugin._observed_kinds
+
+	def state_value(self, name):
+		""" The current value of state name, from our shadow copy if it's valid. """
+		if self._states is None or not self._shadowed:
+			self.refresh()
+			self._states = dict(self.io.states)
+		return self._states[name]
+
+	def invalidate_states(self):
+		""" Forget our shadow states. The next read will fetch from the server. """
+		self._states = None
+
+	def _store_states(self, updates):
+		""" Write-through of state updates we just sent to the server. """
+		if self._states is not None:
+			for update in updates:
+				self._states[update["key"]] = update["value"]
+
+	def _update_states(self, io):
+		""" Indigo told us about new state values. """
+		self._states = dict(io.states)
 
 	#
 	# pass protocol, model, and address through to our io object.
@@ -651,6 +715,7 @@ class Device(IOM, DeviceFeatures, metaclass=IOMetaMap, register=False):
 	def reconfigure_state(self):
 		""" Ask Indigo to re-fetch state information for this device. """
 		self.io.stateListOrDisplayStateIdChanged()
+		self.invalidate_states()
 
 	def stateList(self):
 		""" Generate dynamic state configuration for this device. """
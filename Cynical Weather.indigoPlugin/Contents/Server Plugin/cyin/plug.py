@@ -193,6 +193,18 @@ class Plugin(indigo.PluginBase, iom.PluginCore, iom.Observer, metaclass=cyin.iom
 			return self.apiVersion >= "1.14"
 
 
+	#
+	# The plugin's view of the wall clock
+	#
+	def time(self):
+		""" The current (UNIX) time, as the plugin sees it.
+
+			Time-dependent bookkeeping (such as DeviceState staleness) asks here,
+			so a plugin with its own clock (like an asyn Controller) keeps it all in step.
+		"""
+		return time.time()
+
+
 	#
 	# Managing watch notifications
 	#
@@ -289,6 +301,7 @@ class Plugin(indigo.PluginBase, iom.PluginCore, iom.Observer, metaclass=cyin.iom
 
 	@entry(CONCURRENT)
 	def deviceUpdated(self, old, new):
+		iom.update_states(new)
 		iom.update_object(old, new, new.deviceTypeId)
 		self._notify("device", "update", new, make=lambda x: iom.device(x.id), prior=old)
 
@@ -19,5 +19,6 @@
 #
 # Collect selected parts of the base package
 #
-from forecast.core import Forecast
-from forecast.core import Location, Point, Reading
+from forecast.core import Forecast, Flights
+from forecast.cache import Cache
+from forecast.core import Location, Point, PointView, List, Reading, ReadingParser, OffloadedParser
@@ -0,0 +1,252 @@
+from __future__ import print_function
+#
+# Regression test for forecast (offline; see forecast.core for a live poll)
+#
+import json
+
+import forecast
+from forecast.core import FIELDS
+
+
+print('forecast regression starting...')
+
+
+#
+# A canned reply, shaped like a Visual Crossing timeline reply
+#
+START = 1696143600					# 2023-10-01 07:00 UTC
+
+def point(epoch, n):
+	return {
+		"datetime": "%02d:00:00" % (n % 24),
+		"datetimeEpoch": epoch,
+		"conditions": "Partially cloudy" if n % 3 else "Clear",
+		"description": "Day %d, \"quoted\" \\ and unicode °" % n,
+		"icon": "partly-cloudy-day",
+		"temp": 60 + n % 17 * 0.5,
+		"feelslike": 59.5,
+		"humidity": 40 + n % 50,
+		"pressure": 1013.2,
+		"cloudcover": n * 7 % 101,
+		"windspeed": 3.4 + n % 5,
+		"winddir": n * 45 % 360,
+		"solarradiation": None if n % 4 == 0 else 100.0 + n,
+		"severerisk": 10,
+	}
+
+REPLY = {
+	"queryCost": 1,
+	"latitude": 37.265,
+	"longitude": -121.96,
+	"resolvedAddress": "Somewhere, CA",
+	"timezone": "America/Los_Angeles",
+	"days": [dict(point(START + d * 86400, d), hours=[point(START + d * 86400 + h * 3600, h) for h in range(24)])
+		for d in range(3)],
+	"alerts": [],
+	"currentConditions": point(START + 3600, 1),
+}
+BODY = json.dumps(REPLY).encode('utf8')
+
+
+#
+# Columnar List and PointView
+#
+print('(List)')
+days = forecast.List(REPLY["days"], 'us')
+assert len(days) == 3 and len(forecast.List(None, 'us')) == 0
+assert (days.min, days.max) == (START, START + 2 * 86400)
+for (n, (view, raw)) in enumerate(zip(days, REPLY["days"])):
+	old = forecast.Point(raw, 'us')			# the reference representation
+	for (name, _, _, _) in FIELDS:
+		assert getattr(view, name) == getattr(old, name), (n, name, getattr(view, name), getattr(old, name))
+	assert view.units == 'us'
+assert days[-1].datetimeEpoch == START + 2 * 86400 and days[1].summary == REPLY["days"][1]["description"]
+assert [p.datetimeEpoch for p in days[1:]] == [START + 86400, START + 2 * 86400]
+assert days[0].tempmin is None and days[0].windgust == days[0].windspeed	# absent, and defaulted from another field
+assert days[0].winddir == 360 and days[0].solarradiation == 0 and days[1].solarradiation == 101	# falsy takes the default
+raw = days.column("solarradiation", raw=True)				# ... but the raw column knows it was missing
+assert raw[0] != raw[0] and raw[1] == 101 and len(raw) == len(days)
+assert isinstance(days[0].severerisk, int) and isinstance(days[0].temp, float)
+assert days.column("temp")[2] == days[2].temp
+try:
+	days[3]
+	assert False, "index past the end"
+except IndexError:
+	pass
+try:
+	days[0].wallaby
+	assert False, "unknown field"
+except AttributeError:
+	pass
+
+
+#
+# Incremental parsing must build the same Reading as a whole-body parse,
+# however the body is split into chunks (mid-token, mid-escape, mid-UTF-8 sequence...)
+#
+print('(ReadingParser)')
+def same_reading(a, b):
+	assert (a.latitude, a.longitude, a.location.lat_lon) == (b.latitude, b.longitude, b.location.lat_lon)
+	assert len(a.alerts) == len(b.alerts)
+	for (mine, theirs) in ((a.days, b.days), (a.hours, b.hours), ([a.current], [b.current])):
+		assert len(mine) == len(theirs)
+		for (p, q) in zip(mine, theirs):
+			for (name, _, _, _) in FIELDS:
+				(x, y) = (getattr(p, name), getattr(q, name))
+				assert x == y or x != x and y != y, (name, x, y)
+
+whole = forecast.Reading(BODY, 'us')
+assert len(whole.days) == 3 and len(whole.hours) == 72 and whole.current.temp == 60.5
+random = __import__('random').Random(42)
+splits = [[len(BODY)], [1] * len(BODY)] + [
+	[random.randint(1, 200) for n in range(len(BODY))] for n in range(50)]
+for sizes in splits:
+	parser = forecast.ReadingParser('us', keep_raw=True)
+	pos = 0
+	for size in sizes:
+		if pos >= len(BODY):
+			break
+		parser.feed(BODY[pos:pos+size])
+		pos += size
+	reading = parser.close()
+	same_reading(reading, whole)
+	assert reading.raw == BODY
+parser = forecast.ReadingParser('us')
+parser.feed(BODY)
+assert parser.close().raw is None				# not kept unless asked for
+for bad in (BODY[:len(BODY) // 2], b'{"days": [1, 2]}', b'{"days": [{}, {]}', b'[]'):
+	parser = forecast.ReadingParser('us')
+	try:
+		parser.feed(bad)
+		parser.close()
+		assert False, bad
+	except ValueError:
+		pass
+
+
+#
+# The same parse, run on worker threads while data keeps arriving
+#
+print('(OffloadedParser)')
+import asyn
+import asyn.inject
+
+control = asyn.inject.Controller()
+outcomes = { }
+def outcome(name):
+	def done(ctx, reading=None):
+		outcomes.setdefault(name, ctx.error or reading)
+		if len(outcomes) == 3:
+			control.stop()
+	return done
+def feeder(offloaded, chunks):
+	def tick(ctx):
+		if chunks:
+			offloaded.feed(chunks.pop(0))
+			ctx.reschedule(after=0.001)
+		else:
+			offloaded.close()
+	return tick
+chunks = [BODY[pos:pos+500] for pos in range(0, len(BODY), 500)]
+good = forecast.OffloadedParser(control, forecast.ReadingParser('us', keep_raw=True), outcome('good'))
+bad = forecast.OffloadedParser(control, forecast.ReadingParser('us'), outcome('bad'))
+doomed = forecast.OffloadedParser(control, forecast.ReadingParser('us'), outcome('doomed'))
+control.schedule(feeder(good, list(chunks)))
+control.schedule(feeder(bad, [b'{"days": [{}, {]}'] + list(chunks)))	# fails; the rest is ignored
+doomed.feed(BODY)
+doomed.cancel()
+control.schedule(lambda ctx: outcome('doomed')(ctx), after=0.5)	# never heard from
+control.schedule(lambda ctx: control.stop(), after=10)
+control.run()
+same_reading(outcomes['good'], whole)
+assert outcomes['good'].raw == BODY
+assert isinstance(outcomes['bad'], ValueError) and outcomes['doomed'] is None, outcomes
+control.close()
+
+
+#
+# Reply cache
+#
+print('(Cache)')
+import os
+import time
+import tempfile
+
+folder = tempfile.TemporaryDirectory()
+cache = forecast.Cache(os.path.join(folder.name, "cache"), ttl=600)	# (directory made on demand)
+here = forecast.Location(37.265, -121.96)
+key = cache.key(here, 'us', {'days', 'current'})
+assert key == cache.key(here, 'us', ['current', 'days'])		# include order doesn't matter
+assert key != cache.key(here, 'metric', {'days', 'current'}) and key != cache.key(here, 'us')
+assert cache.load(key) is None
+cache.store(key, BODY, when=START)
+assert cache.load(key) == (START, BODY)
+assert cache.load(cache.key(here, 'metric')) is None
+cache.store(key, b'newer', when=START + 60)
+assert cache.load(key) == (START + 60, b'newer')				# replaced
+assert cache.fresh(START, now=START + 599) and not cache.fresh(START, now=START + 600)
+with open(cache._path(key), 'r+b') as f:						# damage it
+	f.write(b'JUNK')
+assert cache.load(key) is None
+with open(cache._path(key), 'wb') as f:
+	f.write(b'CWR')												# truncated header
+assert cache.load(key) is None
+
+# a poll within the TTL is answered from the cache, with no request
+control = asyn.Controller()
+fc = forecast.Forecast(control)
+fc.apikey = "none"
+fc.location = here
+fc.cache = cache
+fc.keep_raw = False
+cache.store(fc._cache_key(), BODY, when=time.time() - 300)
+got = []
+fc.poll(lambda ctx, reading=None: got.append((ctx.state, reading)))
+assert len(got) == 1 and got[0][0] == 'reading'
+assert got[0][1].cached and got[0][1].raw is None
+same_reading(got[0][1], whole)
+control.close()
+folder.cleanup()
+
+
+#
+# Sharing requests in flight
+#
+print('(Flights)')
+flights = forecast.Flights(precision=2)
+key = flights.key(here, 'us')
+assert key == flights.key(forecast.Location(37.2651, -121.9649), 'us')	# same grid cell
+assert key != flights.key(forecast.Location(37.28, -121.96), 'us') and key != flights.key(here, 'metric')
+assert forecast.Flights(precision=1).key(forecast.Location(37.28, -121.96), 'us') == forecast.Flights(precision=1).key(here, 'us')
+heard = []
+def listener(name):
+	return lambda ctx, *args: heard.append((name, ctx.state, ctx.error, args))
+
+assert not flights.join(key, listener('early'))				# nothing in flight yet
+deliver = flights.start(key, listener('first'))
+assert len(flights) == 1
+assert flights.join(key, listener('second')) and flights.join(key, listener('third'), wants_raw=True)
+assert not flights.join(flights.key(here, 'metric'), listener('other'))
+reading = forecast.Reading(BODY, 'us')
+deliver(asyn.Context('reading'), reading)
+assert [name for (name, _, _, _) in heard] == ['first', 'second', 'third']
+assert all(args[0] is reading for (_, _, _, args) in heard)		# shared, not copied
+assert reading.raw == BODY and len(flights) == 0				# third wanted raw; flight over
+
+heard.clear()
+deliver = flights.start(key, listener('first'))
+assert flights.join(key, listener('second'))
+reading = forecast.Reading(BODY, 'us')
+deliver(asyn.Context('reading'), reading)
+assert reading.raw is None										# nobody wanted it
+
+heard.clear()
+deliver = flights.start(key, listener('first'))
+assert flights.join(key, listener('second'))
+failure = OSError("no route to host")
+deliver(asyn.Error(failure))
+assert [(name, error) for (name, _, error, _) in heard] == [('first', failure), ('second', failure)]
+assert len(flights) == 0 and not flights.join(key, listener('late'))
+
+
+print('forecast regression passed')
@@ -0,0 +1,87 @@
+#
+# forecast.cache - persistent cache of weather service replies
+#
+# Copyright 2023 Perry The Cynic. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#	http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Each entry is one file holding a small header (magic and fetch time)
+# followed by the zlib-compressed raw reply.
+#
+import os
+import time
+import zlib
+import struct
+import hashlib
+
+DEBUG = None
+
+
+MAGIC = b'CWR1'				# file format tag
+HEADER = struct.Struct('!4sd')	# magic, fetch time (UNIX epoch)
+
+
+class Cache(object):
+	""" A directory of last-good weather service replies.
+
+		Entries are keyed by whatever determines the content of a reply
+		(see key()). Each remembers when it was fetched, so callers can decide
+		whether it's still fresh enough to use in place of a new request.
+		Damaged or unreadable entries are treated as missing.
+	"""
+	def __init__(self, directory, ttl):
+		self.directory = directory
+		self.ttl = ttl
+
+	@staticmethod
+	def key(location, units, include=None):
+		""" Make a cache key from the parameters that shape a reply. """
+		include = ','.join(sorted(include)) if include else ''
+		return f"{location.lat:.4f},{location.lon:.4f}/{units}/{include}"
+
+	def load(self, key):
+		""" Return (fetch time, raw reply) for a key, or None if we have nothing. """
+		try:
+			with open(self._path(key), 'rb') as f:
+				data = f.read()
+			(magic, when) = HEADER.unpack_from(data)
+			if magic != MAGIC:
+				return None
+			return (when, zlib.decompress(data[HEADER.size:]))
+		except (OSError, struct.error, zlib.error) as e:
+			if DEBUG and not isinstance(e, FileNotFoundError): DEBUG("cache load", key, "failed:", e)
+			return None
+
+	def store(self, key, raw, when=None):
+		""" Record a (raw) reply for a key, replacing any earlier one. """
+		if when is None:
+			when = time.time()
+		path = self._path(key)
+		try:
+			os.makedirs(self.directory, exist_ok=True)
+			temp = path + '.new'
+			with open(temp, 'wb') as f:
+				f.write(HEADER.pack(MAGIC, when))
+				f.write(zlib.compress(raw, 6))
+			os.replace(temp, path)		# atomic
+			if DEBUG: DEBUG("cache store", key, len(raw), "bytes")
+		except OSError as e:
+			if DEBUG: DEBUG("cache store", key, "failed:", e)
+
+	def fresh(self, when, now=None):
+		""" Is an entry fetched at this time still within its TTL? """
+		return (now or time.time()) - when < self.ttl
+
+	def _path(self, key):
+		name = hashlib.sha1(key.encode('utf8')).hexdigest()
+		return os.path.join(self.directory, name + '.wx')
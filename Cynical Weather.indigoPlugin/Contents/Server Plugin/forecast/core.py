@@ -18,9 +18,14 @@
 # This is currently using the (excellent) Visualcrossing.com service.
 # See https://www.visualcrossing.com/resources/documentation/weather-api/timeline-weather-api.
 #
+import sys
+import math
 import time
+import array
 import datetime
 import urllib.parse
+import codecs
+import re
 
 import json
 
@@ -29,6 +34,8 @@ from astro import Location
 import asyn
 import asyn.http
 
+from forecast.cache import Cache
+
 DEBUG = None
 
 
@@ -37,6 +44,49 @@ DEBUG = None
 #
 APIHOST = 'weather.visualcrossing.com'
 
+NAN = float('nan')
+
+
+#
+# The fields of a "data point" in Visual Crossing parlance, in conversion order.
+# Each entry is (name, type, default, source); a callable default is applied to the
+# partially converted point (so later fields may default from earlier ones).
+#
+FIELDS = [
+	("datetime",			str,	None,	None),
+	("datetimeEpoch",		int,	None,	None),
+	("summary",				str,	"",		"description"),
+	("conditions",			str,	"",		None),
+	("icon",				str,	"unknown", None),
+	("temp",				float,	None,	None),
+	("tempmin",				float,	None,	None),
+	("tempmax",				float,	None,	None),
+	("feelslike",			float,	None,	None),
+	("feelslikemin",		float,	None,	None),
+	("feelslikemax",		float,	None,	None),
+	("dew",					float,	None,	None),
+	("humidity",			float,	None,	None),
+	("pressure",			float,	None,	None),
+	("visibility",			float,	None,	None),
+	("cloudcover",			float,	None,	None),
+	("windspeed",			float,	0,		None),
+	("windgust",			float,	lambda p: p.windspeed, None),
+	("winddir",				float,	360,	None),
+	("precip",				float,	0,		None),
+	("precipprob",			float,	0,		None),
+	("uvindex",				float,	0,		None),
+	("solarradiation",		float,	0,		None),
+	("solarenergy",			float,	0,		None),
+	("moonphase",			float,	None,	None),
+	("severerisk",			int,	0,		None),
+]
+FIELD_TYPES = dict((field[0], field[1]) for field in FIELDS)
+
+# Fields a List also keeps as given by the service, before defaulting, with NaN
+# where there was nothing. The irradiance join needs to tell a missing
+# solarradiation (unknown: estimate it) from a reported 0 (dark).
+RAW_FIELDS = ("solarradiation",)
+
 
 #
 # A "data point" in Visual Crossing parlance
@@ -45,55 +95,127 @@ class Point(object):
 
 	def __init__(self, data, units):
 		self.units = units
-		def convert(name, type, default=None, source=None):
-			source = source or name
-			value = data.get(source) or default
+		for (name, type, default, source) in FIELDS:
+			if callable(default):
+				default = default(self)
+			value = data.get(source or name) or default
 			#if DEBUG: DEBUG(f"convert {source}->{name} from {data.get(source)} default {default} -> {type}({value})")
 			setattr(self, name, None if value is None else type(value))
-		convert("datetime",				str)
-		convert("datetimeEpoch",		int)
-		convert("summary",				str, "", source="description")
-		convert("conditions",			str, "")
-		convert("icon",					str, "unknown")
-		convert("temp",					float)
-		convert("tempmin",				float)
-		convert("tempmax",				float)
-		convert("feelslike",			float)
-		convert("feelslikemin",			float)
-		convert("feelslikemax",			float)
-		convert("dew",					float)
-		convert("humidity",				float)
-		convert("pressure",				float)
-		convert("visibility",			float)
-		convert("cloudcover",			float)
-		convert("windspeed",			float, 0)
-		convert("windgust",				float, self.windspeed)
-		convert("winddir",				float, 360)
-		convert("precip",				float, 0)
-		convert("precipprob",			float, 0)
-		convert("uvindex",				float, 0)
-		convert("solarradiation",		float, 0)
-		convert("solarenergy",			float, 0)
-		convert("moonphase",			float)
-		convert("severerisk",			int, 0)
 
 	def __repr__(self):
-		return "<Forecast Point@{time.ctime(self.datetimeepoch)} T{self.temp} H{self.humidity}"
+		return f"<Forecast Point@{time.ctime(self.datetimeEpoch)} T{self.temp} H{self.humidity}>"
 
 
 #
-# A vector of data points
+# A vector of data points, stored by column.
 #
-class List(list):
+# Numeric fields live in typed arrays (NaN marking absent values); text fields
+# live in plain lists with repeated strings interned. Indexing yields a PointView,
+# which quacks like a Point but merely refers back into the columns.
+#
+class List(object):
 
 	def __init__(self, data, units):
-		if data is None:
-			self.min = self.max = None
-		else:
-			list.__init__(self, [Point(dp, units) for dp in data])
-			times = [dp.datetimeEpoch for dp in self]
-			self.min = min(times)
-			self.max = max(times)
+		self.units = units
+		self.columns = { }
+		self._raw = dict((name, array.array('d')) for name in RAW_FIELDS)
+		self._length = 0
+		self.min = self.max = None
+		for (name, type, _, _) in FIELDS:
+			self.columns[name] = [] if type is str else array.array('d')
+		if data is not None:
+			for dp in data:
+				self.append(dp)
+
+	def append(self, data):
+		""" Convert one raw data point dict and add it to the columns. """
+		row = _Row()
+		for (name, type, default, source) in FIELDS:
+			if callable(default):
+				default = default(row)
+			value = data.get(source or name) or default
+			column = self.columns[name]
+			if type is str:
+				value = None if value is None else sys.intern(str(value))
+				column.append(value)
+			else:
+				value = None if value is None else type(value)
+				column.append(NAN if value is None else value)
+			setattr(row, name, value)
+		for (name, column) in self._raw.items():
+			value = data.get(name)
+			column.append(NAN if value is None or value == "" else float(value))
+		self._length += 1
+		epoch = row.datetimeEpoch
+		if epoch is not None:
+			if self.min is None or epoch < self.min:
+				self.min = epoch
+			if self.max is None or epoch > self.max:
+				self.max = epoch
+
+	def column(self, name, raw=False):
+		""" Return the raw column (array or list) for a field name.
+			With raw, return the service's values before defaulting (NaN if missing);
+			this is only kept for RAW_FIELDS.
+		"""
+		if raw:
+			return self._raw[name]
+		return self.columns[name]
+
+	def __len__(self):
+		return self._length
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [PointView(self, i) for i in range(*index.indices(self._length))]
+		if index < 0:
+			index += self._length
+		if not 0 <= index < self._length:
+			raise IndexError(index)
+		return PointView(self, index)
+
+	def __iter__(self):
+		for i in range(self._length):
+			yield PointView(self, i)
+
+	def __repr__(self):
+		return f"<Forecast List[{self._length}] {self.min}..{self.max}>"
+
+
+class _Row(object):
+	""" Scratch attribute holder for field defaults computed during List.append. """
+	pass
+
+
+#
+# A light-weight, Point-compatible view of one row of a List
+#
+class PointView(object):
+	""" One data point of a columnar List.
+
+		This has the attribute interface of Point but holds no data of its own.
+	"""
+	__slots__ = ('_list', '_index')
+
+	def __init__(self, list, index):
+		self._list = list
+		self._index = index
+
+	@property
+	def units(self):
+		return self._list.units
+
+	def __getattr__(self, name):
+		type = FIELD_TYPES.get(name)
+		if type is None:
+			raise AttributeError(name)
+		value = self._list.columns[name][self._index]
+		if type is str or value is None:
+			return value
+		return None if math.isnan(value) else type(value)
+
+	def __repr__(self):
+		return f"<Forecast Point@{time.ctime(self.datetimeEpoch)} T{self.temp} H{self.humidity}>"
 
 
 #
@@ -120,22 +242,51 @@ class Alert(object):
 class Reading(object):
 
 	def __init__(self, data, units):
-		if DEBUG:
+		""" Make a Reading from a full JSON reply, or an empty one (to fill) if data is None. """
+		if DEBUG and data is not None:
 			with open("/tmp/weather-reading.json", "wb") as f:
 				f.write(data)
 		self.raw = data
 		self.units = units
-		s = json.loads(data)
-		self.location = Location(s["latitude"], s["longitude"])
-		self.alerts = [Alert(ad) for ad in s.get("alerts", [])]
-		current = s.get("currentConditions")
-		self.current = Point(current, self.units) if current else None
-		dayData = s.get("days")
-		if dayData:
-			self.days = List(dayData, self.units)
-		hourData = dayData[0].get("hours")
-		if hourData:
-			self.hours = List(hourData, self.units)
+		self.fetched = None			# when the service produced it (UNIX time)
+		self.cached = False			# delivered from cache (rather than the service)
+		self.latitude = self.longitude = None
+		self.location = None
+		self.alerts = []
+		self.current = None
+		self.days = List(None, self.units)
+		self.hours = List(None, self.units)
+		if data is not None:
+			for name, value in json.loads(data).items():
+				self._member(name, value)
+			self._finish()
+
+	#
+	# Incremental construction. Days and alerts may be fed one element at a time.
+	#
+	def _member(self, name, value):
+		""" Take one top-level member of the reply. """
+		if name == "days" or name == "alerts":
+			for element in value or []:
+				self._element(name, element)
+		elif name == "currentConditions":
+			self.current = Point(value, self.units) if value else None
+		elif name == "latitude" or name == "longitude":
+			setattr(self, name, value)
+
+	def _element(self, name, value):
+		""" Take one element of a top-level array member of the reply. """
+		if not isinstance(value, dict):
+			raise ValueError(f"malformed {name} entry in weather service reply")
+		if name == "days":
+			for hour in value.get("hours") or []:	# hourly data comes with each day
+				self.hours.append(hour)
+			self.days.append(value)
+		elif name == "alerts":
+			self.alerts.append(Alert(value))
+
+	def _finish(self):
+		self.location = Location(self.latitude, self.longitude)
 
 	def getPoint(self, distance, units='days'):
 		if DEBUG: DEBUG(f"getPoint {distance} {units} for {self}")
@@ -156,6 +307,279 @@ class Reading(object):
 		return "<Reading%s current%s>" % (self.location, self.current)
 
 
+#
+# An incremental parser that builds a Reading as reply data arrives.
+#
+_JSON_STRUCT = re.compile(r'["{}\[\]]')		# interesting outside of strings
+_JSON_STRING = re.compile(r'["\\]')			# interesting inside of strings
+_JSON_DELIM = re.compile(r'[,}\]\s]')			# ends a bare scalar
+_JSON_SPACE = re.compile(r'\s*')
+
+STREAMED = ("days", "alerts")					# members parsed element by element
+
+class ReadingParser(object):
+	""" Parse a Visual Crossing reply incrementally.
+
+		Feed() the (decompressed) reply bytes as they arrive; close() returns the
+		finished Reading. Each top-level member, and each element of the "days"
+		and "alerts" arrays, is decoded as soon as its text is complete and then
+		dropped from the buffer, so we never hold more than one element's worth of
+		text (plus whatever the caller asks us to keep for Reading.raw).
+
+		Malformed input raises ValueError.
+	"""
+	def __init__(self, units, keep_raw=False):
+		self.reading = Reading(None, units)
+		self._decoder = codecs.getincrementaldecoder('utf-8')()
+		self._raw = [] if keep_raw else None
+		self._buf = ''
+		self._pos = 0				# scan position in _buf
+		self._state = 'begin'		# structural parse state
+		self._key = None			# current top-level member name
+		self._value = None			# (start, depth, in_string) of value in progress
+
+	def feed(self, data):
+		if self._raw is not None:
+			self._raw.append(data)
+		self._buf += self._decoder.decode(data)
+		self._advance()
+
+	def close(self):
+		self._buf += self._decoder.decode(b'', final=True)
+		self._advance()
+		if self._state != 'done':
+			raise ValueError("incomplete weather service reply")
+		reading = self.reading
+		if self._raw is not None:
+			reading.raw = b''.join(self._raw)
+		reading._finish()
+		return reading
+
+	def _advance(self):
+		""" Make as much progress as the buffered text allows. """
+		while True:
+			if self._value is not None:			# inside a value
+				end = self._scan_value()
+				if end is None:
+					return self._trim()
+				self._complete(end)
+				continue
+			self._pos = _JSON_SPACE.match(self._buf, self._pos).end()
+			if self._pos >= len(self._buf):
+				return self._trim()
+			c = self._buf[self._pos]
+			state = self._state
+			if state == 'begin' and c == '{':
+				self._state = 'key'
+			elif state == 'key' and c == '"':
+				self._start_value()
+				continue
+			elif state == 'key' and c == '}':
+				self._state = 'done'
+			elif state == 'colon' and c == ':':
+				self._state = 'value'
+			elif state == 'value':
+				if c == '[' and self._key in STREAMED:
+					self._state = 'elements'
+				else:
+					self._start_value()
+					continue
+			elif state == 'elements' and c == ']':
+				self._state = 'next'
+			elif state == 'elements':
+				self._start_value()
+				continue
+			elif state == 'element-next' and c == ',':
+				self._state = 'elements'
+			elif state == 'element-next' and c == ']':
+				self._state = 'next'
+			elif state == 'next' and c == ',':
+				self._state = 'key'
+			elif state == 'next' and c == '}':
+				self._state = 'done'
+			else:
+				raise ValueError(f"unexpected {c!r} in weather service reply ({state})")
+			self._pos += 1
+
+	def _start_value(self):
+		c = self._buf[self._pos]
+		self._value = (self._pos, 0, False)
+		if c == '"':
+			self._value = (self._pos, 0, True)
+			self._pos += 1
+		elif c in '{[':
+			self._value = (self._pos, 1, False)
+			self._pos += 1
+
+	def _scan_value(self):
+		""" Scan ahead in the value in progress. Return its end, or None if it's incomplete. """
+		(start, depth, in_string) = self._value
+		buf = self._buf
+		pos = self._pos
+		if depth == 0 and not in_string and buf[start] != '"':	# bare scalar
+			m = _JSON_DELIM.search(buf, pos)
+			if m is None:
+				self._pos = len(buf)
+				return None
+			return m.start()
+		while True:
+			if in_string:
+				m = _JSON_STRING.search(buf, pos)
+				if m is None or m.end() >= len(buf) and m.group() == '\\':
+					self._pos = len(buf) if m is None else m.start()	# resume at escape
+					self._value = (start, depth, in_string)
+					return None
+				if m.group() == '\\':
+					pos = m.end() + 1			# skip escaped character
+					continue
+				pos = m.end()
+				in_string = False
+				if depth == 0:				# plain string value
+					return pos
+			else:
+				m = _JSON_STRUCT.search(buf, pos)
+				if m is None:
+					self._pos = len(buf)
+					self._value = (start, depth, in_string)
+					return None
+				pos = m.end()
+				c = m.group()
+				if c == '"':
+					in_string = True
+				elif c in '{[':
+					depth += 1
+				else:
+					depth -= 1
+					if depth == 0:
+						return pos
+
+	def _complete(self, end):
+		""" A value has been fully scanned. Decode and dispatch it. """
+		start = self._value[0]
+		value = json.loads(self._buf[start:end])
+		self._value = None
+		self._pos = end
+		state = self._state
+		if state == 'key':
+			self._key = value
+			self._state = 'colon'
+		elif state == 'value':
+			self.reading._member(self._key, value)
+			self._state = 'next'
+		elif state == 'elements':
+			self.reading._element(self._key, value)
+			self._state = 'element-next'
+		self._trim()
+
+	def _trim(self):
+		""" Discard consumed text from the buffer. """
+		if self._value is not None:
+			keep = self._value[0]
+			self._value = (0,) + self._value[1:]
+		else:
+			keep = self._pos
+		if keep:
+			self._buf = self._buf[keep:]
+			self._pos -= keep
+
+
+class OffloadedParser(object):
+	""" Run a ReadingParser on worker threads (control.submit) as data arrives.
+
+		Feed() and close() are called on the controller thread. Data that arrives
+		while a batch is being parsed is collected and goes out as the next batch,
+		so only one thread works on the parser at a time and the controller thread
+		never parses. The finished Reading (or the parse error) is called out as a
+		'result' (or Error) Context on the controller thread. Cancel() abandons it.
+	"""
+	def __init__(self, control, parser, callout):
+		self.control = control
+		self.parser = parser
+		self.callout = callout
+		self._chunks = []			# data waiting for the next batch
+		self._job = None			# batch in progress (asyn.pool.Job)
+		self._closed = False		# no more data coming
+		self._stopped = False		# failed or cancelled
+
+	def feed(self, data):
+		if not self._stopped:
+			self._chunks.append(data)
+			self._kick()
+
+	def close(self):
+		self._closed = True
+		self._kick()
+
+	def cancel(self):
+		self._stopped = True
+		if self._job:
+			self._job.cancel()
+
+	def _kick(self):
+		""" Start the next batch if the parser is idle. """
+		if self._job or self._stopped:
+			return
+		if self._chunks:
+			data = b''.join(self._chunks)
+			self._chunks = []
+			self._job = self.control.submit(self.parser.feed, data, callout=self._fed)
+		elif self._closed:
+			self._stopped = True
+			self._job = self.control.submit(self.parser.close, callout=self.callout)
+
+	def _fed(self, ctx, *args):
+		self._job = None
+		if ctx.error:
+			self._stopped = True
+			self.callout(ctx)
+		elif ctx.state == 'result':
+			self._kick()
+
+
+#
+# Sharing of in-flight requests among Forecasts asking for (about) the same thing.
+#
+class Flights(object):
+	""" A registry of weather service requests in progress.
+
+		Forecasts that share a Flights object and poll for locations that
+		fall into the same grid cell (lat/lon rounded to precision decimal places),
+		with the same units and include set, share a single request while it is
+		in flight. Its outcome is delivered to all of them; readings are shared,
+		not copied.
+	"""
+	def __init__(self, precision=2):
+		self.precision = precision
+		self._flights = { }			# key -> [(callout, wants_raw), ...]
+
+	def key(self, location, units, include=None):
+		return (round(location.lat, self.precision), round(location.lon, self.precision),
+			units, frozenset(include or ()))
+
+	def join(self, key, callout, wants_raw=False):
+		""" Subscribe to a request already in flight. Returns False if there is none. """
+		flight = self._flights.get(key)
+		if flight is None:
+			return False
+		flight.append((callout, wants_raw))
+		return True
+
+	def start(self, key, callout, wants_raw=False):
+		""" Begin a new flight and return the callout that completes it. """
+		flight = self._flights[key] = [(callout, wants_raw)]
+		def deliver(ctx, *args):
+			if self._flights.get(key) is flight:
+				del self._flights[key]		# later polls start over
+			for (sub, _) in flight:
+				sub(ctx, *args)
+			if args and isinstance(args[0], Reading) and not any(raw for (_, raw) in flight):
+				args[0].raw = None
+		return deliver
+
+	def __len__(self):
+		return len(self._flights)
+
+
 #
 # A communications channel to the weather service.
 #
@@ -172,40 +596,134 @@ class Forecast(asyn.Callable):
 		self.location = None
 		self.user_agent = None
 		self.units = 'us'
-
-	def poll(self, callout):
-		""" Explicitly get data from the weather service, using preset parameters. """
+		self.include = None			# set of data sections to ask for (None for default)
+		self.stream = False			# parse replies incrementally as they arrive
+		self.offload = False		# parse replies on worker threads (control.submit), streamed or whole
+		self.keep_raw = True		# keep raw reply text in Reading.raw
+		self.cache = None			# Cache of earlier replies (if any)
+		self.flights = None			# Flights shared with other Forecasts (if any)
+		self._warm = False			# has delivered a reading (cached or not)
+
+	def poll(self, callout, cached=True):
+		""" Get data from the weather service, using preset parameters.
+
+			If we have a cache, a cached reply within its TTL is delivered instead
+			of asking the service (unless cached is False). On the first poll, any
+			older cached reply is also delivered immediately before we go ask for
+			a new one, so clients have something to show while they wait.
+			Readings served from the cache have .cached set.
+		"""
 		assert self.apikey is not None
+		if self.cache and cached:
+			entry = self.cache.load(self._cache_key())
+			if entry:
+				(fetched, raw) = entry
+				fresh = self.cache.fresh(fetched, self.control.time())
+				if fresh or not self._warm:
+					try:
+						reading = Reading(raw, self.units)
+					except ValueError:
+						reading = None		# damaged; ignore it
+					if reading:
+						if DEBUG: DEBUG("using cached reading from", time.ctime(fetched))
+						reading.fetched = fetched
+						reading.cached = True
+						if not self.keep_raw:
+							reading.raw = None
+						self._warm = True
+						callout(asyn.Context('reading'), reading)
+						if fresh:
+							return
+		self._warm = True
+		wants_raw = self.keep_raw or self.cache is not None
+		def receive(ctx, reading=None):
+			if ctx.state == 'reading' and self.cache and reading.raw is not None:
+				self.cache.store(self._cache_key(), reading.raw, reading.fetched)
+			callout(ctx, reading)
+		if self.flights is not None:
+			key = self.flights.key(self.location, self.units, self.include)
+			if self.flights.join(key, receive, wants_raw):
+				if DEBUG: DEBUG("joining request in flight for", key)
+				return
+			deliver = self.flights.start(key, receive, wants_raw)
+		else:
+			def deliver(ctx, reading=None):
+				receive(ctx, reading)
+				if reading is not None and not self.keep_raw:
+					reading.raw = None
+		parser = ReadingParser(self.units, keep_raw=wants_raw) if self.stream else None
+		def fail(error):
+			deliver(asyn.Error(error))
+			req.clear_callouts()
+			req.close()
 		def cb(ctx, *args):
 			if ctx.error:
-				callout(ctx)
+				if isinstance(parser, OffloadedParser):
+					parser.cancel()
+				deliver(ctx)
 				req.close()
+			elif ctx.state == 'data':
+				if req.n_status == '200':
+					try:
+						parser.feed(args[0])
+					except ValueError as e:
+						fail(e)
 			elif ctx.state == 'body':
 				if req.n_status == '200':
-					callout(asyn.Context('reading'), Reading(args[0], self.units))
+					if isinstance(parser, OffloadedParser):
+						parser.close()		# (the Reading arrives through streamed)
+						return
+					if self.offload:
+						self.control.submit(Reading, args[0], self.units, callout=parsed)
+						return
+					try:
+						reading = parser.close() if parser else Reading(args[0], self.units)
+					except ValueError as e:
+						return fail(e)
+					reading.fetched = self.control.time()
+					deliver(asyn.Context('reading'), reading)
 				else:
-					callout(asyn.Context('error'), req)
+					deliver(asyn.Context('error'), req)
+		def parsed(ctx, reading=None):
+			if ctx.error:
+				deliver(ctx)
+			elif ctx.state == 'result':
+				reading.fetched = self.control.time()
+				deliver(asyn.Context('reading'), reading)
+		def streamed(ctx, reading=None):
+			if ctx.error:				# bad reply; stop receiving it
+				req.clear_callouts()
+				req.close()
+			parsed(ctx, reading)
+		if parser and self.offload:		# parse as it arrives, but not on our thread
+			parser = OffloadedParser(self.control, parser, callout=streamed)
 		query = dict(
 			units=self.units
 		)
-		req = self._request("forecast", callout=cb, query=query)
+		req = self._request("forecast", callout=cb, query=query, stream=self.stream)
 
 
 	#
 	# Web interface primitives
 	#
-	def _request(self, req, callout=None, action='GET', query=None):
+	def _request(self, req, callout=None, action='GET', query=None, stream=False):
 		""" Send a web request to the weather server. """
 		query = {
 			"unitGroup": self.units,
 			"key": self.apikey
 		}
+		if self.include:
+			query["include"] = ','.join(sorted(self.include))
 		request = asyn.http.request(self.control, callout=callout, action=action, query=query)
+		request.stream_body = stream
 		if self.user_agent:
 			request.user_agent = self.user_agent + ' ' + request.user_agent
 		request.open(self._weburl(req))
 		return request
 
+	def _cache_key(self):
+		return Cache.key(self.location, self.units, self.include)
+
 	def _weburl(self, op):
 		return urllib.parse.urlunsplit(('https', APIHOST,
 			f"/VisualCrossingWebServices/rest/services/timeline/{self.location.lat},{self.location.lon}",
@@ -213,7 +731,7 @@ class Forecast(asyn.Callable):
 
 
 #
-# Regression test
+# Live test (needs an API key). The offline regression is python -m forecast.
 #
 if __name__ == "__main__":
 	import getopt, sys
@@ -228,6 +746,8 @@ if __name__ == "__main__":
 	for opt, value in opts:
 		if opt == '-H':
 			asyn.http.DEBUG = dlog
+	if len(args) != 1:
+		sys.exit("usage: python -m forecast.core [-H] apikey")
 	control = asyn.Controller()
 	forecast = Forecast(control, callout=cb)
 	forecast.apikey = args[0]
@@ -30,6 +30,9 @@ from cyin.check import *
 
 
 MIN_REFRESH = 5		# enforced minimum minutes between update calls per location
+SHARE_GRID = 2		# default decimal places of lat/lon for sharing requests among locations
+CACHE_MARGIN = 60	# seconds by which cached replies expire ahead of the next timed poll
+STATE_STALE = 60 * 60	# seconds before unchanged weather states are rewritten anyway
 
 
 #
@@ -37,29 +40,29 @@ MIN_REFRESH = 5		# enforced minimum minutes between update calls per location
 #
 class ForecastDevice(cyin.devstate.Device):
 
-	conditions = cyin.DeviceState(type=str)
-	temp = cyin.DeviceState(type=float)
-	feelslike = cyin.DeviceState(type=float)
-	dew = cyin.DeviceState(type=float)
-	pressure = cyin.DeviceState(type=float, format=" mb")
-	humidity = cyin.DeviceState(type=float, format="%")
-	visibility = cyin.DeviceState(type=float, format=" mi")
-	cloudcover = cyin.DeviceState(type=float, format="%")
-	windspeed = cyin.DeviceState(type=float, format=" mph")
-	windgust = cyin.DeviceState(type=float, format=" mph")
-	winddir = cyin.DeviceState(type=float, format="\xb0")
-	precip = cyin.DeviceState(type=float, format=" in")
-	precipprob = cyin.DeviceState(type=float, format="%")
-	icon = cyin.DeviceState(type=str)
-	moonphase = cyin.DeviceState(type=float)
-	uvindex = cyin.DeviceState(type=float)
-	solarradiation = cyin.DeviceState(type=float, format=" W/m^2")
-	solarenergy = cyin.DeviceState(type=float, format=" MJ/m^2")
-	severerisk = cyin.DeviceState(type=int)
-	data = cyin.DeviceState(type=str)
+	conditions = cyin.DeviceState(type=str, deadband=0, stale=STATE_STALE)
+	temp = cyin.DeviceState(type=float, deadband=0, stale=STATE_STALE)
+	feelslike = cyin.DeviceState(type=float, deadband=0, stale=STATE_STALE)
+	dew = cyin.DeviceState(type=float, deadband=0, stale=STATE_STALE)
+	pressure = cyin.DeviceState(type=float, format=" mb", deadband=0, stale=STATE_STALE)
+	humidity = cyin.DeviceState(type=float, format="%", deadband=0, stale=STATE_STALE)
+	visibility = cyin.DeviceState(type=float, format=" mi", deadband=0, stale=STATE_STALE)
+	cloudcover = cyin.DeviceState(type=float, format="%", deadband=0, stale=STATE_STALE)
+	windspeed = cyin.DeviceState(type=float, format=" mph", deadband=0, stale=STATE_STALE)
+	windgust = cyin.DeviceState(type=float, format=" mph", deadband=0, stale=STATE_STALE)
+	winddir = cyin.DeviceState(type=float, format="\xb0", deadband=0, stale=STATE_STALE)
+	precip = cyin.DeviceState(type=float, format=" in", deadband=0, stale=STATE_STALE)
+	precipprob = cyin.DeviceState(type=float, format="%", deadband=0, stale=STATE_STALE)
+	icon = cyin.DeviceState(type=str, deadband=0, stale=STATE_STALE)
+	moonphase = cyin.DeviceState(type=float, deadband=0, stale=STATE_STALE)
+	uvindex = cyin.DeviceState(type=float, deadband=0, stale=STATE_STALE)
+	solarradiation = cyin.DeviceState(type=float, format=" W/m^2", deadband=0, stale=STATE_STALE)
+	solarenergy = cyin.DeviceState(type=float, format=" MJ/m^2", deadband=0, stale=STATE_STALE)
+	severerisk = cyin.DeviceState(type=int, deadband=0, stale=STATE_STALE)
+	data = cyin.DeviceState(type=str, deadband=0, stale=STATE_STALE)
 	
-	alert = cyin.DeviceState(type=str)
-	alert_url = cyin.DeviceState(type=str)
+	alert = cyin.DeviceState(type=str, deadband=0, stale=STATE_STALE)
+	alert_url = cyin.DeviceState(type=str, deadband=0, stale=STATE_STALE)
 
 	def updateReading(self, reading):
 		def update(name, op=lambda s: s):
@@ -68,38 +71,40 @@ class ForecastDevice(cyin.devstate.Device):
 				#debug(f"update {name} from {value}")
 				if value is not None:
 					setattr(self, name, op(value))
-		update("summary")
-		update("conditions")
-		update("temp", lambda s: round(s, 1))
-		update("feelslike", lambda s: round(s, 1))
-		update("tempmin", lambda s: round(s, 1))
-		update("tempmax", lambda s: round(s, 1))
-		update("feelslikemin", lambda s: round(s, 1))
-		update("feelslikemax", lambda s: round(s, 1))
-		update("dew", lambda s: round(s, 1))
-		update("pressure")
-		update("humidity", lambda s: round(s, 1))
-		update("visibility", lambda s: round(s, 1))
-		update("cloudcover")
-		update("windspeed")
-		update("windgust")
-		update("winddir")
-		update("precip")
-		update("precipprob")
-		update("icon")
-		update("moonphase")
-		update("uvindex")
-		update("solarradiation")
-		update("solarenergy")
-		update("severerisk")
+		with self.batched_states():
+			update("summary")
+			update("conditions")
+			update("temp", lambda s: round(s, 1))
+			update("feelslike", lambda s: round(s, 1))
+			update("tempmin", lambda s: round(s, 1))
+			update("tempmax", lambda s: round(s, 1))
+			update("feelslikemin", lambda s: round(s, 1))
+			update("feelslikemax", lambda s: round(s, 1))
+			update("dew", lambda s: round(s, 1))
+			update("pressure")
+			update("humidity", lambda s: round(s, 1))
+			update("visibility", lambda s: round(s, 1))
+			update("cloudcover")
+			update("windspeed")
+			update("windgust")
+			update("winddir")
+			update("precip")
+			update("precipprob")
+			update("icon")
+			update("moonphase")
+			update("uvindex")
+			update("solarradiation")
+			update("solarenergy")
+			update("severerisk")
 	
 	def updateAlerts(self, alerts):
-		now = datetime.datetime.now()
+		now = datetime.datetime.fromtimestamp(cyin.plugin.time())
 		debug(f"alerts={alerts}")
 		alerts = [alert for alert in alerts if alert.ends >= now]
 		debug(f"filtered alerts={alerts}")
-		self.alert = '; '.join([alert.headline for alert in alerts])
-		self.alert_url = '; '.join([alert.link for alert in alerts if alert.link])
+		with self.batched_states():
+			self.alert = '; '.join([alert.headline for alert in alerts])
+			self.alert_url = '; '.join([alert.link for alert in alerts if alert.link])
 
 
 #
@@ -128,6 +133,12 @@ class Location(ForecastDevice):
 		self.forecast.apikey = cyin.plugin.apikey
 		self.forecast.location = self._location()
 		self.forecast.units = self.units
+		self.forecast.stream = True		# parse replies as they arrive...
+		self.forecast.offload = True		# ... on pool threads
+		self.forecast.keep_raw = self.rawdata
+		self.forecast.flights = cyin.plugin.flights
+		# a reply is stamped when it arrives, so it must expire a bit before the next timed poll
+		self.forecast.cache = forecast.Cache(cyin.plugin.cache_folder, ttl=(self.polling or MIN_REFRESH) * 60 - CACHE_MARGIN)
 		self.forecast.user_agent = f"Cynical-Weather/{self.plugin.version}"
 		self.set_display_address(astro.s_location(*self.forecast.location.lat_lon))
 		if self.polling:
@@ -147,13 +158,14 @@ class Location(ForecastDevice):
 			self._poll_timer = cyin.plugin.schedule(self.update, after=self.polling * 60)
 		self.poll(force=not ctx)
 
-	def poll(self, force=False):
+	def poll(self, force=False, fresh=False):
 		""" Explicitly poll for new data about this location.
 
 			This is clamped to no more than once per MIN_REFRESH minutes to avoid
 			accidentally hitting the daily request limit.
+			Unless fresh is True, a recent enough cached reply may be used instead.
 		"""
-		now = time.time()
+		now = cyin.plugin.time()
 		if not force and self._last_update + MIN_REFRESH * 60 > now:
 			return error(self.name, "ignoring update request within {MIN_REFRESH} minutes of last one")
 		self._last_update = now
@@ -164,14 +176,16 @@ class Location(ForecastDevice):
 				return self.fail_hard(f"weather service error: {data.n_status} {data.v_status}")
 			elif ctx.state == 'reading':
 				self.lastReading = data
-				debug(self.name, "updated")
-				self.data = data.raw.decode("utf8") if self.rawdata else "N/A"
-				self.updateAlerts(data.alerts)
-				self.updateReading(data.current)
-				for fc in Forecast.all():
+				debug(self.name, "updated from cache" if data.cached else "updated")
+				with self.batched_states():
+					self.data = data.raw.decode("utf8") if self.rawdata and data.raw else "N/A"
+					self.updateAlerts(data.alerts)
+					self.updateReading(data.current)
+				for fc in self.all_dependents(Forecast):
 					fc.updateForecast(data)
+				cyin.plugin.updateIrradiance(self, data)
 				self.proceed("ready", recovered=True)
-		self.forecast.poll(callout=updated)
+		self.forecast.poll(callout=updated, cached=not fresh)
 
 	def _location(self):
 		""" Return a forecast.Location object from either explicit data or the default location. """
@@ -182,7 +196,7 @@ class Location(ForecastDevice):
 
 	@cyin.action
 	def update_data(self, action):
-		self.poll()
+		self.poll(fresh=True)
 
 
 #
@@ -194,11 +208,11 @@ class Forecast(ForecastDevice):
 	
 	# Summary (aka description) and the min/max temperatures are only reported for forecasts.
 	# Well, for hourly and daily reports, which amounts to the same for us.
-	summary = cyin.DeviceState(type=str)
-	tempmin = cyin.DeviceState(type=float)
-	tempmax = cyin.DeviceState(type=float)
-	feelslikemin = cyin.DeviceState(type=float)
-	feelslikemax = cyin.DeviceState(type=float)
+	summary = cyin.DeviceState(type=str, deadband=0, stale=STATE_STALE)
+	tempmin = cyin.DeviceState(type=float, deadband=0, stale=STATE_STALE)
+	tempmax = cyin.DeviceState(type=float, deadband=0, stale=STATE_STALE)
+	feelslikemin = cyin.DeviceState(type=float, deadband=0, stale=STATE_STALE)
+	feelslikemax = cyin.DeviceState(type=float, deadband=0, stale=STATE_STALE)
 
 	def start(self):
 		super(Forecast, self).start()
@@ -215,14 +229,15 @@ class Forecast(ForecastDevice):
 		data = reading.getPoint(self.distance, self.units)
 		if data:
 			debug(self.name, "updated for", time.ctime(data.datetimeEpoch))
-			self.updateReading(data)
-			self.updateAlerts(reading.alerts)
+			with self.batched_states():
+				self.updateReading(data)
+				self.updateAlerts(reading.alerts)
 		else:
 			error(f"{self.name}: {self.hostdev.name} has no reading for {self.distance} {self.units} ahead")
 
 	@cyin.action
 	def update_data(self, action):
-		self.hostdev.poll()
+		self.hostdev.poll(fresh=True)
 
 
 class HourForecast(Forecast):
@@ -239,48 +254,113 @@ class DayForecast(Forecast):
 # A (window et al) orientation in space. This is what we orient the Sun against.
 # Actual updates are driven by a central timer.
 #
+# In event mode, each Orientation predicts when its index next moves into
+# a different band (leaving 0, reaching 100, or crossing one of its thresholds),
+# and the central timer is set for the earliest such moment.
+#
 BELOW_HORIZON = -5			# degrees below horizon to be effectively dark
 FULL_HEIGHT = 15			# height above horizon to presume full solar impact
+SUN_STALE = 15 * 60			# seconds before sun states are rewritten despite small moves
+EVENT_SAMPLE = 60			# step when looking ahead for index band changes (seconds)
+IRRADIANCE_HOURS = 48		# hours of irradiance forecast, starting with the current one
+
+def judge(sun, facings, horizons=None):
+	""" Return (relative azimuth, height, index) for each of facings, given one sun position.
+
+		Horizons, if given, holds an astro.Horizon (or None) for each facing;
+		the index is 0 while the Sun is behind it.
+	"""
+	(A, h) = sun		# (Azimuth to true S, angular height)
+
+	#
+	# A is south-relative (0 = due South, -90 = due East, +145 = Northwest).
+	# Relative azimuth is the north-by-north delta, normalized to [-180, +180).
+	#
+	azimuths = [(A - facing + 360) % 360 - 180 for facing in facings]
+
+	# judgment calls (rudimentary)
+	if h < 0:				# sun not shining on any surface
+		return [(az, h, 0) for az in azimuths]
+	h_index = h * 100.0 / FULL_HEIGHT	# height scale [0..100] <-> [0..FULL_HEIGHT]
+	judged = [(az, h, 0 if abs(az) > 90 else min(100 - abs(az) * 100.0 / 90, h_index))	# azimuth scale [0..100] <-> [90..0]
+		for az in azimuths]
+	if horizons:
+		judged = [(az, h, index if index == 0 or horizon is None or horizon.clear(sun) else 0)
+			for ((az, h, index), horizon) in zip(judged, horizons)]
+	return judged
+
 
 class Orientation(cyin.Device):
 	""" An orientation in space (a "facing").
 
 		This object has state indicating the direction TO the Sun for someone
-		facing this direction. It pays no attention to occlusion or obstacles.
+		facing this direction. Obstacles can be described by a horizon profile,
+		bearing:height pairs telling how high the Sun must be to clear them.
+		If a Location is given, the Sun is tracked at its coordinates;
+		otherwise at the Indigo server's.
 	"""
 	facing = cyin.PluginProperty(type=int, check=[check_range(min=0, max=360)])
-
-	azimuth = cyin.DeviceState(type=float, format="\xb0")
-	height = cyin.DeviceState(type=float, format="\xb0")
-	index = cyin.DeviceState(type=int)
-
-	_refresh_timer = None
+	location = cyin.PluginProperty(type=cyin.device, required=False)
+	thresholds = cyin.PluginProperty(type=str, required=False,
+		check=[check_format(r'\s*(\d+\s*(,\s*\d+\s*)*)?', error='comma-separated index values, please')])
+	horizon = cyin.PluginProperty(type=str, required=False, check=[check_makes(astro.Horizon.parse, 'invalid horizon profile')])
+
+	azimuth = cyin.DeviceState(type=float, format="\xb0", deadband=0.5, stale=SUN_STALE)
+	height = cyin.DeviceState(type=float, format="\xb0", deadband=0.5, stale=SUN_STALE)
+	index = cyin.DeviceState(type=int, deadband=0, stale=SUN_STALE)	# change-only: triggers compare it to thresholds
+	direct_sun = cyin.DeviceState(type=str)
+	irradiance = cyin.DeviceState(type=float, format=" W/m^2", deadband=0, stale=STATE_STALE)
+	irradiance_forecast = cyin.DeviceState(type=str, deadband=0, stale=STATE_STALE)
+
+	_levels = ()
+	_horizon = None			# compiled astro.Horizon
+	_direct_day = None		# date direct_sun was computed for
 
 	def start(self):
-		self.set_display_address(astro.s_bearing(self.facing))
-		if cyin.plugin.active:			# runtime start
-			cyin.plugin.updateSun()
-
-	def _update(self, sun):
-		(A, h) = sun		# (Azimuth to true S, angular height)
-
-		#
-		# A is south-relative (0 = due South, -90 = due East, +145 = Northwest)
-		#
-		az = A - self.facing + 180		# north-by-north delta 
-		az = (az + 180) % 360 - 180		# normalize to [-180, +180]
-
-		# straight angles
-		self.azimuth = round(az, 2)		# sun azimuth relative to facing
-		self.height = round(h, 2)		# sun height over horizontal
-
-		# judgment calls (rudimentary)
-		if h < 0 or abs(az) > 90:		# sun not shining on this surface
-			self.index = 0
+		self._levels = sorted(int(t) for t in (self.thresholds or "").split(",") if t.strip())
+		self._horizon = astro.Horizon.parse(self.horizon) if self.horizon else None
+		self._direct_day = None
+		if isinstance(self.location, Location):
+			self.set_display_address(f"{astro.s_bearing(self.facing)} @ {self.location.name}")
 		else:
-			az_index = 100 - abs(az) * 100.0 / 90	# azimuth scale [0..100] <-> [90..0]
-			h_index = h * 100.0 / FULL_HEIGHT	# height scale [0..100] <-> [0..FULL_HEIGHT]
-			self.index = min(az_index, h_index)
+			self.set_display_address(astro.s_bearing(self.facing))
+		if cyin.plugin.active:			# runtime start
+			cyin.plugin.requestSunUpdate()
+		if isinstance(self.location, Location) and self.location.lastReading:
+			cyin.plugin.updateIrradiance(self.location, self.location.lastReading, [self])
+
+	def sun_lat_lon(self):
+		""" (lat, lon) of the Location device we track the Sun at, or None for the server's. """
+		if isinstance(self.location, Location):
+			return self.location._location().lat_lon
+
+	def _update(self, az, h, index):
+		with self.batched_states():
+			# straight angles
+			self.azimuth = round(az, 2)		# sun azimuth relative to facing
+			self.height = round(h, 2)		# sun height over horizontal
+			self.index = index
+
+	def _band(self, sun):
+		""" Which band the index falls into (what an event would be about). """
+		index = int(judge(sun, [self.facing], [self._horizon])[0][2])	# as published
+		return (index > 0) + (index >= 100) + sum(1 for level in self._levels if index >= level)
+
+	def next_event(self, ephemeris, now, until):
+		""" The first time in (now, until] at which our index changes band, or None. """
+		band = self._band(ephemeris.position(now))
+		t0 = now
+		while t0 < until:
+			t1 = min(t0 + EVENT_SAMPLE, until)
+			if self._band(ephemeris.position(t1)) != band:
+				while t1 - t0 > 1:		# narrow down to a second
+					mid = (t0 + t1) / 2
+					if self._band(ephemeris.position(mid)) == band:
+						t0 = mid
+					else:
+						t1 = mid
+				return t1
+			t0 = t1
 
 
 #
@@ -309,13 +389,20 @@ class Precipitation(cyin.Event):
 #
 SUN_REFRESH = 1 * 60	# every minute
 #SUN_REFRESH = 1		# debug (every second)
+SUN_COARSE = 5 * 60		# longest interval between updates in event mode
+SUN_COALESCE = 1		# requested updates this close together share one pass
+SUN_DARK = 6 * 3600		# recheck interval in polar night
 
 class Plugin(cyin.asynplugin.Plugin):
 
 	apikey = cyin.PluginPreference(type=str, required=False)
+	share_grid = cyin.PluginPreference(type=int, required=False, check=[check_range(0, 6)])
+	sun_events = cyin.PluginPreference(type=bool, required=False)
 
 	def startup(self):
 		cyin.asynplugin.Plugin.startup(self)
+		self.flights = forecast.Flights(precision=SHARE_GRID if self.share_grid is None else self.share_grid)
+		self.cache_folder = f"{indigo.server.getInstallFolderPath()}/Preferences/Plugins/{self.ident}/cache"
 		self.setLocation()
 		self._solar_refresh = self.schedule(self.updateSun)
 
@@ -328,15 +415,110 @@ class Plugin(cyin.asynplugin.Plugin):
 	def setLocation(self):
 		# set sun-tracking Location for "here"
 		self._sunLoc = astro.SunLocation(*indigo.server.getLatitudeAndLongitude())
+		self._ephemeris = astro.Ephemeris(self._sunLoc)
+		self._ephemerides = { }		# (lat, lon) -> Ephemeris for Location-bound orientations
 #		debug("location is", self._sunLoc)
 
 	def updateSun(self, ctx=None):
-		if ctx:
+		now = self.time()
+		groups = self._sunGroups()
+		if self.sun_events:
+			self._solar_refresh.cancel()	# (harmless if it just fired)
+			self._solar_refresh = self.schedule(self.updateSun, at=self._nextSunEvent(now, groups))
+		elif ctx:
 			ctx.reschedule(after=SUN_REFRESH)
 		# else just do an update pass and leave the timer running
-		sun = None
+		for (ephemeris, orients) in groups.items():
+			sun = ephemeris.position(now)		# once per place
+#			debug("sun is at", sun, "for", ephemeris.location)
+			for (orient, judged) in zip(orients, judge(sun,
+					[orient.facing for orient in orients], [orient._horizon for orient in orients])):
+				orient._update(*judged)
+			self._updateDirectSun(ephemeris.location, orients, now)
+
+	@staticmethod
+	def _updateDirectSun(location, orients, now):
+		""" Once a day, work out when each Orientation gets direct sun. """
+		today = datetime.date.fromtimestamp(now)
+		orients = [orient for orient in orients if orient._direct_day != today]
+		if orients:
+			intervals = astro.direct_sun(location,
+				[orient.facing for orient in orients], [orient._horizon for orient in orients], date=today)
+			for (orient, spans) in zip(orients, intervals):
+				orient.direct_sun = ', '.join(
+					f"{time.strftime('%H:%M', time.localtime(start))}-{time.strftime('%H:%M', time.localtime(end))}"
+					for (start, end) in spans) or "none"
+				orient._direct_day = today
+
+	def _sunGroups(self):
+		""" Collect Orientations by the Ephemeris for where they are. """
+		groups = { }
+		used = { }
 		for orient in Orientation.all():
-			if sun is None:	# lazy
-				sun = astro.sun_position(time.time(), self._sunLoc)
-#				debug("sun is at", sun)
-			orient._update(sun)
+			where = orient.sun_lat_lon()
+			if where is None:
+				ephemeris = self._ephemeris
+			else:
+				ephemeris = used[where] = self._ephemerides.get(where) or astro.Ephemeris(astro.SunLocation(*where))
+			groups.setdefault(ephemeris, []).append(orient)
+		self._ephemerides = used	# forget places nobody tracks anymore
+		return groups
+
+	def updateIrradiance(self, location, reading, orients=None):
+		""" Forecast irradiance on Orientations bound to a Location from its hourly reading. """
+		if orients is None:
+			orients = [orient for orient in Orientation.all() if orient.location is location]
+		hours = reading.hours
+		if not orients or not hours:
+			return
+		times = hours.column("datetimeEpoch")
+		now = self.time()
+		first = next((n for (n, t) in enumerate(times) if t + 3600 > now), len(times))	# current hour
+		span = slice(first, first + IRRADIANCE_HOURS)
+		times = times[span]
+		if not times:
+			return error(location.name, "has no hourly data for irradiance forecasts")
+		power = astro.incident(astro.SunLocation(*location._location().lat_lon), times,
+			hours.column("solarradiation", raw=True)[span], hours.column("cloudcover")[span],
+			[orient.facing for orient in orients], [orient._horizon for orient in orients])
+		for (orient, watts) in zip(orients, power):
+			with orient.batched_states():
+				orient.irradiance = round(watts[0])
+				orient.irradiance_forecast = ', '.join(str(round(w)) for w in watts)
+
+	_sun_pending = None
+
+	def requestSunUpdate(self):
+		""" Ask for an updateSun pass shortly. Requests made close together share one pass. """
+		if self._sun_pending is None:
+			self._sun_pending = self.schedule(self._pendingSunUpdate, after=SUN_COALESCE)
+
+	def _pendingSunUpdate(self, ctx):
+		self._sun_pending = None
+		self.updateSun()
+
+	def _nextSunEvent(self, now, groups):
+		""" When should updateSun run next in event mode? """
+		when = now + SUN_DARK		# nothing to track
+		for (ephemeris, orients) in groups.items():
+			(A, h) = ephemeris.position(now)
+			if h < BELOW_HORIZON:		# dark here; sleep until the sun comes back
+				when = min(when, self._sunReturns(ephemeris.location, now))
+				continue
+			when = min(when, now + SUN_COARSE)
+			for orient in orients:
+				event = orient.next_event(ephemeris, now, when)
+				if event:
+					when = event
+		return when
+
+	@staticmethod
+	def _sunReturns(location, now):
+		""" The next time the sun rises above BELOW_HORIZON at location (or a recheck time). """
+		day = astro.sun_day(location, astro.local_date(location, now))
+		for date in (day.date, day.date + datetime.timedelta(days=1)):
+			rise = astro.sun_day(location, date).crossing(BELOW_HORIZON)[0]
+			if rise and rise > now:
+				debug("sun down at", location, "until", time.ctime(rise))
+				return rise
+		return now + SUN_DARK	# polar night